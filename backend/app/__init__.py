@@ -1,10 +1,11 @@
 import os
 from flask import Flask, render_template
-from .db import init_db, close_connection
+from .db import init_db, check_schema, close_connection, DATABASE, DEFAULT_PRAGMAS
+from .logging_config import configure_logging
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-def create_app():
+def create_app(config=None):
     app = Flask(
         __name__,
         template_folder=os.path.join(BASE_DIR, "templates"),
@@ -14,10 +15,22 @@ def create_app():
     app.config.update({
         'SECRET_KEY': 'cambia-esta-clave',
         'UPLOAD_FOLDER': 'uploads',
-        'REPORT_FOLDER': 'static/reports'
+        'REPORT_FOLDER': 'static/reports',
+        'DATABASE': DATABASE,
+        'SQLITE_PRAGMAS': dict(DEFAULT_PRAGMAS),
+        'SQLITE_REUSE_CONNECTIONS': True,
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
+        'LOG_FILE': os.getenv('LOG_FILE'),
+        # Procesos del pool de renderizado (0 = renderizar en el proceso del request)
+        'RENDER_WORKERS': int(os.getenv('RENDER_WORKERS', '2')),
+        'RENDER_TIMEOUT': 60
     })
+    if config:
+        app.config.update(config)
 
+    configure_logging(app)
     init_db(app)
+    check_schema(app.config['DATABASE'], app.config['SQLITE_PRAGMAS'])
 
     # register blueprints
     from .blueprints.auth import bp as auth_bp
@@ -29,6 +42,7 @@ def create_app():
     from .blueprints.api import bp as api_bp
     from .blueprints.whatsapp import bp as whatsapp_bp
     from .blueprints.payment_plans import bp as payment_plans_bp
+    from .blueprints.reconciliation import bp as reconciliation_bp
 
 
     app.register_blueprint(auth_bp)
@@ -40,6 +54,11 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(whatsapp_bp)
     app.register_blueprint(payment_plans_bp)
+    app.register_blueprint(reconciliation_bp)
+
+    if not app.testing:
+        from .utils import render_pool
+        render_pool.start(app.config['RENDER_WORKERS'], app.config['RENDER_TIMEOUT'])
     
     @app.route('/')
     def index():
@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, send_file, flash
-from ..db import get_db
+from flask import Blueprint, render_template, session, redirect, url_for, request, send_file, flash, current_app
+from ..db import get_db, change_token
+from ..migrations import migrate
+from ..utils.http import conditional
 from werkzeug.security import generate_password_hash
 import os
+import sqlite3
+import tempfile
+import threading
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 def login_required(f):
     from functools import wraps
@@ -11,34 +16,42 @@ def login_required(f):
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return wrapper
-# En backend/app/blueprints/admin.py
+# Totales del panel en caché por proceso, por base y versión de datos (change_token):
+# cualquier escritura, de este u otro proceso, cambia la versión
+_panel_cache = {}
+_panel_lock = threading.Lock()
+
+def invalidate_panel_cache():
+    with _panel_lock:
+        _panel_cache.clear()
+
+def _panel_totals(db):
+    """Clientes, pagos pendientes, completados y total recaudado en una sola consulta"""
+    key = current_app.config['DATABASE']
+    version, _ = change_token(db)
+    with _panel_lock:
+        cached = _panel_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    # revenue_rollup tiene una fila por mes: no se recorre payments
+    row = db.execute('''
+        SELECT (SELECT COUNT(*) FROM clients) AS clients,
+               COALESCE(SUM(pending_count), 0) AS pending,
+               COALESCE(SUM(paid_count), 0) AS completed,
+               COALESCE(SUM(paid_amount), 0) AS revenue
+        FROM revenue_rollup WHERE source = 'payments'
+    ''').fetchone()
+    totals = {'clients': row['clients'], 'pending': row['pending'],
+              'completed': row['completed'], 'revenue': round(row['revenue'], 2)}
+    with _panel_lock:
+        _panel_cache[key] = (version, totals)
+    return totals
+
 @bp.route('/panel')
 @login_required
+@conditional
 def panel():
-    db = get_db()
-    
-    # Clientes totales
-    cur = db.execute('SELECT COUNT(*) as c FROM clients')
-    clients = cur.fetchone()['c']
-    
-    # Pagos pendientes
-    cur = db.execute("SELECT COUNT(*) as c FROM payments WHERE status='pending'")
-    pending = cur.fetchone()['c']
-    
-    # Pagos completados
-    cur = db.execute("SELECT COUNT(*) as c FROM payments WHERE status='paid'")
-    completed = cur.fetchone()['c']
-    
-    # Total recaudado
-    cur = db.execute("SELECT SUM(amount) as total FROM payments WHERE status='paid'")
-    revenue_row = cur.fetchone()
-    revenue = revenue_row['total'] if revenue_row['total'] else 0
-    
-    return render_template('panel.html', 
-                         clients=clients, 
-                         pending=pending,
-                         completed=completed,
-                         revenue=revenue)
+    return render_template('panel.html', **_panel_totals(get_db()))
 @bp.route('/usuarios', methods=['GET','POST'])
 @login_required
 def usuarios():
@@ -52,11 +65,17 @@ def usuarios():
 @bp.route('/backup')
 @login_required
 def backup():
-    dbfile = os.path.join(os.getcwd(), 'sistemapagos.db')
-    if not os.path.exists(dbfile):
-        flash('DB no encontrada')
-        return redirect(url_for('admin.panel'))
-    return send_file(dbfile, as_attachment=True)
+    """Copia consistente de la base con la API de backup de SQLite (incluye lo que está en el WAL)"""
+    fd, tmp = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    out = sqlite3.connect(tmp)
+    try:
+        get_db().backup(out)
+    finally:
+        out.close()
+    response = send_file(tmp, as_attachment=True, download_name='sistemapagos.db')
+    response.call_on_close(lambda: os.remove(tmp))
+    return response
 @bp.route('/restore', methods=['POST'])
 @login_required
 def restore():
@@ -64,10 +83,31 @@ def restore():
         flash('No file')
         return redirect(url_for('admin.panel'))
     f = request.files['file']
-    path = os.path.join(os.getcwd(), 'restore_upload.db')
-    f.save(path)
-    os.replace(path, os.path.join(os.getcwd(), 'sistemapagos.db'))
-    flash('Base restaurada. Reinicie la app.')
+    fd, tmp = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        f.save(tmp)
+        uploaded = sqlite3.connect(tmp)
+        try:
+            if uploaded.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise sqlite3.DatabaseError('quick_check falló')
+            # Copia página a página sobre la base en uso: las demás conexiones (y su WAL)
+            # ven el contenido restaurado, sin reemplazar el archivo por debajo
+            db = get_db()
+            if db.in_transaction:
+                db.rollback()
+            uploaded.backup(db)
+        finally:
+            uploaded.close()
+    except sqlite3.DatabaseError as e:
+        flash(f'Archivo de base inválido: {e}')
+        return redirect(url_for('admin.panel'))
+    finally:
+        os.remove(tmp)
+    # El respaldo puede tener un esquema anterior
+    migrate(current_app.config['DATABASE'], current_app.config['SQLITE_PRAGMAS'])
+    invalidate_panel_cache()
+    flash('Base restaurada.')
     return redirect(url_for('admin.panel'))
 @bp.route('/historial')
 @login_required
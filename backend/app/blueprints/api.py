@@ -1,25 +1,224 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app, stream_with_context
 from ..db import get_db
+from ..utils.phones import find_clients_by_phone
+from ..utils.http import conditional
+from urllib.parse import urlencode
+import gzip
+import json
+import zlib
 bp = Blueprint('api', __name__)
+
+CLIENT_FIELDS = ('id', 'name', 'phone', 'monthly_amount', 'signup_date', 'active')
+PAYMENT_FIELDS = ('id', 'client_id', 'year', 'month', 'amount', 'status',
+                  'custom_amount', 'paid_date', 'payment_type')
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Por debajo de este tamaño comprimir no compensa
+COMPRESS_MIN_SIZE = 1024
+CHANGE_TABLES = ('clients', 'payments', 'uploads')
+CHANGES_DEFAULT_LIMIT = 10000
+CHANGES_MAX_LIMIT = 100000
+CHANGES_CHUNK = 1000
+# Filas por bloque al transmitir la lista completa
+ROWS_CHUNK = 500
+
+class _BadRequest(Exception):
+    pass
+
+def _fields(allowed):
+    """Columnas pedidas con ?fields=a,b (siempre incluye id, que es el cursor)"""
+    raw = request.args.get('fields')
+    if not raw:
+        return allowed
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise _BadRequest(f"unknown fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return tuple(dict.fromkeys(fields))
+
+def _page():
+    """(after_id, limit) si la petición pagina; (None, None) para la lista completa"""
+    if 'after_id' not in request.args and 'limit' not in request.args:
+        return None, None
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return after_id, min(max(limit, 1), MAX_PAGE_SIZE)
+
+def _compress(body):
+    """Devuelve (cuerpo, Content-Encoding) según Accept-Encoding"""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    accepted = request.accept_encodings
+    if accepted['gzip']:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    if accepted['deflate']:
+        return zlib.compress(body, 6), 'deflate'
+    return body, None
+
+def _encode_rows(columns, rows):
+    return json.dumps([dict(zip(columns, r)) for r in rows], ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+def _stream_rows(cur, columns, first):
+    """Lista JSON por bloques de ROWS_CHUNK filas: la memoria no crece con el total"""
+    yield b'[' + _encode_rows(columns, first)[1:-1]
+    while True:
+        rows = cur.fetchmany(ROWS_CHUNK)
+        if not rows:
+            break
+        yield b',' + _encode_rows(columns, rows)[1:-1]
+    yield b']'
+
+def _compress_stream(chunks, encoding):
+    # wbits=31 produce formato gzip; 15, zlib (Content-Encoding: deflate)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _rows_response(cur, limit=None):
+    """
+    Serializa el cursor directamente a JSON (tuplas + nombres de columna, sin
+    pasar por dict(Row)/jsonify) y comprime la respuesta si el cliente lo acepta.
+    Sin limit, si hay más de ROWS_CHUNK filas la lista se transmite por bloques.
+    """
+    columns = [d[0] for d in cur.description]
+    rows = cur.fetchall() if limit is not None else cur.fetchmany(ROWS_CHUNK)
+    if limit is None and len(rows) == ROWS_CHUNK:
+        accepted = request.accept_encodings
+        encoding = 'gzip' if accepted['gzip'] else 'deflate' if accepted['deflate'] else None
+        chunks = _stream_rows(cur, columns, rows)
+        if encoding:
+            chunks = _compress_stream(chunks, encoding)
+        response = current_app.response_class(stream_with_context(chunks), mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+    body, encoding = _compress(_encode_rows(columns, rows))
+    response = current_app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if limit is not None and len(rows) == limit:
+        next_after_id = rows[-1][columns.index('id')]
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+        args = request.args.to_dict()
+        args['after_id'] = next_after_id
+        args['limit'] = limit
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
+
+@bp.errorhandler(_BadRequest)
+def _bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
 @bp.route('/clients', methods=['GET'])
+@conditional
 def api_clients():
+    """
+    Clientes. Sin parámetros devuelve la lista completa; con after_id/limit pagina
+    por id (la siguiente página se indica en X-Next-After-Id y Link).
+    """
     db = get_db()
-    cur = db.execute('SELECT id,name,phone,monthly_amount,signup_date,active FROM clients')
-    rows = [dict(r) for r in cur.fetchall()]
-    return jsonify(rows)
+    columns = ','.join(_fields(CLIENT_FIELDS))
+    after_id, limit = _page()
+    if limit is None:
+        cur = db.execute(f'SELECT {columns} FROM clients ORDER BY id')
+    else:
+        cur = db.execute(f'SELECT {columns} FROM clients WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+    return _rows_response(cur, limit)
+@bp.route('/clients/by-phone', methods=['GET'])
+@conditional
+def api_clients_by_phone():
+    phone = request.args.get('phone', '')
+    if not phone.strip():
+        return jsonify({'error': 'phone required'}), 400
+    rows = find_clients_by_phone(get_db(), phone, request.args.get('country_code', '51'))
+    return jsonify([{k: r[k] for k in ('id', 'name', 'phone', 'phone_e164', 'monthly_amount', 'signup_date', 'active')}
+                    for r in rows])
 @bp.route('/client/<int:client_id>/payments', methods=['GET'])
+@conditional
 def api_client_payments(client_id):
+    """Pagos del cliente por año y mes; con after_id/limit pagina por id"""
+    db = get_db()
+    columns = ','.join(_fields(PAYMENT_FIELDS))
+    after_id, limit = _page()
+    if limit is None:
+        cur = db.execute(f'SELECT {columns} FROM payments WHERE client_id=? ORDER BY year,month', (client_id,))
+    else:
+        cur = db.execute(f'SELECT {columns} FROM payments WHERE client_id=? AND id > ? ORDER BY id LIMIT ?',
+                         (client_id, after_id, limit))
+    return _rows_response(cur, limit)
+def _change_events(since, limit, tables):
+    """
+    Recorre historial_cambios por id (clave primaria) en bloques de CHANGES_CHUNK.
+    old_values/new_values ya son JSON (json_object en los triggers) y se copian tal cual.
+    La última línea lleva el cursor para retomar: {"next_since": ..., "has_more": ...}
+    """
     db = get_db()
-    cur = db.execute('SELECT * FROM payments WHERE client_id=? ORDER BY year,month', (client_id,))
-    rows = [dict(r) for r in cur.fetchall()]
-    return jsonify(rows)
+    placeholders = ','.join('?' * len(tables))
+    sql = f'''
+        SELECT id, tabla, operacion, fecha_hora, old_values, new_values
+        FROM historial_cambios
+        WHERE id > ? AND tabla IN ({placeholders})
+        ORDER BY id
+        LIMIT ?
+    '''
+    last_id = since
+    remaining = limit
+    has_more = False
+    while remaining > 0:
+        chunk = db.execute(sql, (last_id, *tables, min(remaining, CHANGES_CHUNK))).fetchall()
+        if not chunk:
+            break
+        lines = []
+        for change_id, table, operation, changed_at, old, new in chunk:
+            lines.append('{"id":%d,"table":%s,"op":%s,"at":%s,"old":%s,"new":%s}\n' % (
+                change_id, json.dumps(table), json.dumps(operation), json.dumps(changed_at),
+                old or 'null', new or 'null'))
+        yield ''.join(lines)
+        last_id = chunk[-1][0]
+        remaining -= len(chunk)
+        if remaining == 0:
+            has_more = db.execute(f'SELECT 1 FROM historial_cambios WHERE id > ? AND tabla IN ({placeholders}) LIMIT 1',
+                                  (last_id, *tables)).fetchone() is not None
+    yield json.dumps({'next_since': last_id, 'has_more': has_more}) + '\n'
+
+@bp.route('/changes', methods=['GET'])
+def api_changes():
+    """
+    Cambios posteriores a ?since=<id> en orden de id, como NDJSON. Para sincronizar
+    se guarda next_since de la última línea y se vuelve a pedir con ese valor.
+    Filtros opcionales: ?tables=clients,payments y ?limit=.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', CHANGES_DEFAULT_LIMIT, type=int), 1), CHANGES_MAX_LIMIT)
+    tables = request.args.get('tables')
+    if tables:
+        tables = tuple(dict.fromkeys(t.strip() for t in tables.split(',') if t.strip()))
+        unknown = [t for t in tables if t not in CHANGE_TABLES]
+        if unknown or not tables:
+            raise _BadRequest(f"unknown tables: {', '.join(unknown)}")
+    else:
+        tables = CHANGE_TABLES
+    return current_app.response_class(
+        stream_with_context(_change_events(since, limit, tables)),
+        mimetype='application/x-ndjson'
+    )
 # Agregar estas rutas al archivo existente
 @bp.route('/payment-plans', methods=['GET'])
+@conditional
 def api_payment_plans():
     from ..blueprints.payment_plans import get_all_plans
     return get_all_plans()
 
 @bp.route('/payment-plans/<int:client_id>', methods=['GET'])
+@conditional
 def api_client_plan(client_id):
     from ..blueprints.payment_plans import get_client_plan
-    return get_client_plan(client_id)
\ No newline at end of file
+    return get_client_plan(client_id)
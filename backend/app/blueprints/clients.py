@@ -1,7 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, current_app, stream_with_context
 from ..db import get_db
+from ..maintenance import backfill_payments
+from ..utils.tabular import read_rows, pick, parse_amount, parse_date
+from ..utils.phones import to_e164
+from whatsapp_sender.utils import validate_phone
 from datetime import datetime
+import json
+import logging
+import re
+import shutil
+import tempfile
 bp = Blueprint('clients', __name__, url_prefix='/clients')
+logger = logging.getLogger(__name__)
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -10,17 +20,82 @@ def login_required(f):
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return wrapper
+def _match_expression(q):
+    """Convierte la búsqueda en una consulta FTS5: cada término (>= 3 caracteres) entre comillas"""
+    q = re.sub(r'(?<=\d)[\s\-\.()]+(?=\d)', '', q).replace('+', ' ')
+    terms = [t for t in q.split() if len(t) >= 3]
+    return ' AND '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+def search_clients(db, q, after=None, limit=50):
+    """
+    Busca clientes por nombre o teléfono con paginación keyset.
+
+    Con búsqueda: índice FTS5 trigram, primero los nombres que empiezan con `q`
+    y luego por relevancia (bm25). Sin búsqueda: orden alfabético.
+    `after` es el cursor devuelto por la página anterior. Retorna (filas, cursor_siguiente).
+    """
+    match = _match_expression(q) if q else ''
+    params = {'limit': limit}
+    if match:
+        params.update({'match': match, 'prefix': q.replace('%', '') + '%'})
+        keyset = ''
+        if after:
+            rank, score, last_id = after.split(':')
+            params.update({'a_rank': int(rank), 'a_score': float(score), 'a_id': int(last_id)})
+            keyset = 'WHERE (prefix_rank, score, id) > (:a_rank, :a_score, :a_id)'
+        cur = db.execute(f'''
+            SELECT * FROM (
+                SELECT c.*, CASE WHEN c.name LIKE :prefix THEN 0 ELSE 1 END AS prefix_rank,
+                       bm25(clients_fts) AS score
+                FROM clients_fts
+                JOIN clients c ON c.id = clients_fts.rowid
+                WHERE clients_fts MATCH :match
+            )
+            {keyset}
+            ORDER BY prefix_rank, score, id
+            LIMIT :limit
+        ''', params)
+        rows = cur.fetchall()
+        cursor = lambda r: f"{r['prefix_rank']}:{r['score']!r}:{r['id']}"
+    else:
+        where = ''
+        if q:
+            # Términos de menos de 3 caracteres: prefijo de nombre
+            where = 'WHERE name LIKE :prefix'
+            params['prefix'] = q.replace('%', '') + '%'
+        if after:
+            name, _, last_id = after.rpartition(':')
+            params.update({'a_name': name, 'a_id': int(last_id)})
+            where += (' AND ' if where else 'WHERE ') + '(name, id) > (:a_name, :a_id)'
+        cur = db.execute(f'SELECT * FROM clients {where} ORDER BY name, id LIMIT :limit', params)
+        rows = cur.fetchall()
+        cursor = lambda r: f"{r['name']}:{r['id']}"
+    next_cursor = cursor(rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
+
 @bp.route('/')
 @login_required
 def index():
     q = request.args.get('q','').strip()
+    after = request.args.get('after') or None
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
     db = get_db()
-    if q:
-        cur = db.execute("SELECT * FROM clients WHERE name LIKE ? OR phone LIKE ?", ('%'+q+'%','%'+q+'%'))
-    else:
-        cur = db.execute('SELECT * FROM clients ORDER BY name')
-    rows = cur.fetchall()
-    return render_template('clientes.html', clients=rows, q=q)
+    try:
+        rows, next_cursor = search_clients(db, q, after, per_page)
+    except ValueError:
+        rows, next_cursor = search_clients(db, q, None, per_page)
+    return render_template('clientes.html', clients=rows, q=q, next_cursor=next_cursor, per_page=per_page)
+
+@bp.route('/search.json')
+@login_required
+def search_json():
+    """Autocompletado: hasta `limit` clientes para `q`"""
+    q = request.args.get('q','').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not q:
+        return jsonify([])
+    rows, _ = search_clients(get_db(), q, None, limit)
+    return jsonify([{'id': r['id'], 'name': r['name'], 'phone': r['phone'], 'active': r['active']} for r in rows])
 @bp.route('/add', methods=['GET','POST'])
 @login_required
 def add():
@@ -30,10 +105,10 @@ def add():
         amount = float(request.form.get('monthly_amount') or 0)
         signup = request.form.get('signup_date') or datetime.now().strftime('%Y-%m-%d')
         db = get_db()
-        cur = db.execute('INSERT INTO clients(name, phone, monthly_amount, signup_date) VALUES (?, ?, ?, ?)', (name, phone, amount, signup))
-        db.commit()
+        cur = db.execute('INSERT INTO clients(name, phone, phone_e164, monthly_amount, signup_date) VALUES (?, ?, ?, ?, ?)', (name, phone, to_e164(phone), amount, signup))
         client_id = cur.lastrowid
-        _generate_payments_for_client(db, client_id, signup, amount)
+        _generate_payments_for_client(db, client_id)
+        db.commit()
         return redirect(url_for('clients.index'))
     return render_template('detalle_cliente.html', client=None)
 @bp.route('/edit/<int:client_id>', methods=['GET','POST'])
@@ -45,7 +120,7 @@ def edit(client_id):
         phone = request.form.get('phone')
         amount = float(request.form.get('monthly_amount') or 0)
         active = 1 if request.form.get('active')=='on' else 0
-        db.execute('UPDATE clients SET name=?, phone=?, monthly_amount=?, active=? WHERE id=?', (name, phone, amount, active, client_id))
+        db.execute('UPDATE clients SET name=?, phone=?, phone_e164=?, monthly_amount=?, active=? WHERE id=?', (name, phone, to_e164(phone), amount, active, client_id))
         db.commit()
         return redirect(url_for('clients.index'))
     cur = db.execute('SELECT * FROM clients WHERE id=?', (client_id,))
@@ -62,18 +137,103 @@ def detail(client_id):
     cur = db.execute('SELECT * FROM uploads WHERE client_id=? ORDER BY uploaded_at DESC', (client_id,))
     uploads = cur.fetchall()
     return render_template('detalle_cliente.html', client=client, payments=payments, uploads=uploads)
-def _generate_payments_for_client(db, client_id, signup_date, monthly_amount):
-    from datetime import datetime
-    sd = datetime.strptime(signup_date.split('T')[0], '%Y-%m-%d')
-    today = datetime.now()
-    year = sd.year
-    month = sd.month
-    while (year < today.year) or (year==today.year and month<=today.month):
-        cur = db.execute('SELECT COUNT(*) FROM payments WHERE client_id=? AND year=? AND month=?', (client_id, year, month))
-        if cur.fetchone()[0]==0:
-            db.execute('INSERT INTO payments(client_id, year, month, amount, status) VALUES (?, ?, ?, ?, ?)', (client_id, year, month, monthly_amount, 'pending'))
-        month += 1
-        if month>12:
-            month=1
-            year+=1
+def _generate_payments_for_client(db, client_id):
+    """Crea los pagos pendientes desde el alta hasta el mes actual (sin commit: misma transacción que el alta)"""
+    return backfill_payments(db, client_id=client_id, active_only=False)
+
+IMPORT_BATCH_SIZE = 1000
+# Máximo de errores detallados en la respuesta (el total siempre se informa)
+IMPORT_MAX_ERRORS = 200
+
+def _parse_client_row(row, country_code, today):
+    """Valida y normaliza una fila del archivo. Retorna (valores, error)"""
+    name = pick(row, 'nombre', 'name', 'cliente')
+    if not name:
+        return None, 'Falta el nombre'
+    phone = pick(row, 'telefono', 'phone', 'celular')
+    phone_e164 = None
+    if phone is not None:
+        phone = str(phone).strip()
+        ok, normalized, error = validate_phone(phone, country_code)
+        if not ok:
+            return None, f'Teléfono inválido ({error})'
+        # Igual que al agregar o editar: phone queda como se ingresó y phone_e164 normalizado
+        phone_e164 = '+' + normalized
+    raw_amount = pick(row, 'monto_mensual', 'monthly_amount', 'monto', 'amount')
+    amount = parse_amount(raw_amount) if raw_amount is not None else 0.0
+    if amount is None or amount < 0:
+        return None, 'Monto inválido'
+    raw_date = pick(row, 'fecha_alta', 'signup_date', 'alta', 'fecha')
+    signup = parse_date(raw_date) if raw_date is not None else today
+    if signup is None:
+        return None, 'Fecha de alta inválida'
+    active = pick(row, 'activo', 'active')
+    active = 0 if str(active).strip().lower() in ('0', 'no', 'false', 'inactivo') else 1
+    return (str(name).strip(), phone, phone_e164, amount, signup, active), None
+
+def _import_batch(db, batch):
+    """Inserta un lote de clientes y sus pagos en una transacción"""
+    last_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM clients').fetchone()[0]
+    db.executemany('INSERT INTO clients(name, phone, phone_e164, monthly_amount, signup_date, active) VALUES (?, ?, ?, ?, ?, ?)',
+                   batch)
+    created = backfill_payments(db, active_only=False, after_id=last_id)
     db.commit()
+    return created
+
+def _import_clients(stream, filename, country_code):
+    """Genera el progreso de la importación como líneas JSON"""
+    db = get_db()
+    today = datetime.now().strftime('%Y-%m-%d')
+    known = {r[0] for r in db.execute('SELECT phone_e164 FROM clients WHERE phone_e164 IS NOT NULL')}
+    batch = []
+    errors = []
+    error_count = processed = imported = payments = 0
+    try:
+        for line_number, row in enumerate(read_rows(stream, filename), 2):
+            processed += 1
+            values, error = _parse_client_row(row, country_code, today)
+            if values and values[2] and values[2] in known:
+                values, error = None, 'Teléfono duplicado'
+            if error:
+                error_count += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({'line': line_number, 'error': error})
+                continue
+            if values[2]:
+                known.add(values[2])
+            batch.append(values)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                payments += _import_batch(db, batch)
+                imported += len(batch)
+                batch = []
+                yield json.dumps({'processed': processed, 'imported': imported, 'errors': error_count}) + '\n'
+        if batch:
+            payments += _import_batch(db, batch)
+            imported += len(batch)
+    except Exception as e:
+        db.rollback()
+        logger.exception("Error importando clientes desde %s", filename)
+        yield json.dumps({'done': False, 'error': str(e), 'processed': processed, 'imported': imported}) + '\n'
+        return
+    yield json.dumps({'done': True, 'processed': processed, 'imported': imported,
+                      'payments_created': payments, 'errors': error_count, 'error_details': errors}) + '\n'
+
+@bp.route('/import', methods=['POST'])
+@login_required
+def import_clients():
+    """
+    Importa clientes desde un CSV/XLSX (nombre, telefono, monto_mensual, fecha_alta, activo).
+    Responde con una línea JSON de progreso por lote y una línea final con el resumen.
+    """
+    f = request.files.get('file')
+    if f is None or not f.filename:
+        return jsonify({'error': 'Se requiere un archivo'}), 400
+    country_code = request.form.get('country_code', '51')
+    # El archivo del request se cierra al terminar la vista: copiarlo antes de transmitir
+    upload = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    shutil.copyfileobj(f.stream, upload)
+    upload.seek(0)
+    return current_app.response_class(
+        stream_with_context(_import_clients(upload, f.filename, country_code)),
+        mimetype='application/x-ndjson'
+    )
@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, current_app, send_file, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, current_app, send_file, jsonify, stream_with_context
 from ..db import get_db
 from datetime import datetime
-import csv, io, os
-from ..utils.pdf import invoice_pdf
-from ..utils.excel import payments_to_xlsx
+import csv, io, json, os
+from ..utils.invoices import cached_invoice, invoices_zip_stream
+from ..utils.excel import payments_query_xlsx
+from ..utils.http import conditional, busy_response
+from ..utils import render_pool
 bp = Blueprint('payments', __name__, url_prefix='/payments')
 def login_required(f):
     from functools import wraps
@@ -21,53 +23,55 @@ def consolidada():
     year = int(request.args.get('year', datetime.now().year))
     db = get_db()
     
-    # Obtener todos los clientes activos
-    cur = db.execute('SELECT * FROM clients WHERE active=1 ORDER BY name')
-    clients = cur.fetchall()
+    # Asegurar que existen los 12 meses de cada cliente activo (una sola transacción)
+    _backfill_year(db, year)
+    
+    # Una sola consulta: clientes activos con sus pagos del año
+    cur = db.execute('''
+        SELECT c.*, p.id AS payment_id, p.month AS payment_month, p.amount AS payment_amount,
+               p.status AS payment_status, p.paid_date AS payment_paid_date
+        FROM clients c
+        LEFT JOIN payments p ON p.client_id = c.id AND p.year = ?
+        WHERE c.active = 1
+        ORDER BY c.name, c.id, p.month, p.id
+    ''', (year,))
     
-    # Para cada cliente, obtener sus 12 meses de pagos
     clients_data = []
-    for client in clients:
-        client_dict = dict(client)
-        
-        # Obtener pagos de los 12 meses
-        payments_dict = {}
-        cur = db.execute('SELECT * FROM payments WHERE client_id=? AND year=? ORDER BY month', (client['id'], year))
-        payments = cur.fetchall()
-        
-        for payment in payments:
-            payments_dict[payment['month']] = {
-                'id': payment['id'],
-                'amount': payment['amount'],
-                'status': payment['status'],
-                'paid_date': payment['paid_date']
+    current = None
+    for row in cur:
+        if current is None or current['id'] != row['id']:
+            current = {k: row[k] for k in row.keys() if not k.startswith('payment_')}
+            current['payments'] = {}
+            clients_data.append(current)
+        if row['payment_id'] is not None:
+            current['payments'][row['payment_month']] = {
+                'id': row['payment_id'],
+                'amount': row['payment_amount'],
+                'status': row['payment_status'],
+                'paid_date': row['payment_paid_date']
             }
-        
-        # Asegurar que existen los 12 meses (crear si no existen)
-        for month in range(1, 13):
-            if month not in payments_dict:
-                # Crear pago pendiente con monto del cliente
-                cur = db.execute(
-                    'INSERT INTO payments(client_id, year, month, amount, status) VALUES (?, ?, ?, ?, ?)',
-                    (client['id'], year, month, client['monthly_amount'], 'pending')
-                )
-                db.commit()
-                payment_id = cur.lastrowid
-                
-                payments_dict[month] = {
-                    'id': payment_id,
-                    'amount': client['monthly_amount'],
-                    'status': 'pending',
-                    'paid_date': None
-                }
-        
-        client_dict['payments'] = payments_dict
-        clients_data.append(client_dict)
     
     return render_template('pagos_consolidada.html', clients=clients_data, year=year)
 
+def _backfill_year(db, year):
+    """Crea en bloque los meses faltantes del año para todos los clientes activos"""
+    cur = db.execute('''
+        INSERT INTO payments(client_id, year, month, amount, status)
+        WITH RECURSIVE months(m) AS (SELECT 1 UNION ALL SELECT m + 1 FROM months WHERE m < 12)
+        SELECT c.id, ?, months.m, c.monthly_amount, 'pending'
+        FROM clients c CROSS JOIN months
+        WHERE c.active = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM payments p
+            WHERE p.client_id = c.id AND p.year = ? AND p.month = months.m
+        )
+    ''', (year, year))
+    db.commit()
+    return cur.rowcount
+
 @bp.route('/client/<int:client_id>')
 @login_required
+@conditional
 def client_payments(client_id):
     year = int(request.args.get('year', datetime.now().year))
     db = get_db()
@@ -75,7 +79,7 @@ def client_payments(client_id):
     client = cur.fetchone()
     cur = db.execute('SELECT * FROM payments WHERE client_id=? AND year=? ORDER BY month', (client_id, year))
     payments = cur.fetchall()
-    cur = db.execute("SELECT SUM(CASE WHEN status='pending' THEN 1 ELSE 0 END) as pending_count, SUM(CASE WHEN status='pending' THEN amount ELSE 0 END) as total_debt, SUM(CASE WHEN status='paid' THEN amount ELSE 0 END) as total_paid FROM payments WHERE client_id=?", (client_id,))
+    cur = db.execute('SELECT pending_count, total_debt, total_paid FROM client_balances WHERE client_id=?', (client_id,))
     summary = cur.fetchone()
     return render_template('pagos.html', client=client, payments=payments, year=year, summary=summary)
 @bp.route('/mark_paid/<int:payment_id>', methods=['POST'])
@@ -118,36 +122,217 @@ def mark_paid_json(payment_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Marcar varios pagos como pagados en una sola transacción
+@bp.route('/mark_paid_bulk', methods=['POST'])
+@login_required
+def mark_paid_bulk():
+    """
+    JSON: payment_ids: [..]  o  client_id + from (YYYY-MM) + to (YYYY-MM); payment_type opcional.
+    Retorna el resultado por id: 'paid', 'already_paid' o 'not_found'.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        # Formulario: payment_ids puede repetirse (payment_ids=3&payment_ids=4)
+        data = request.form.to_dict()
+        if 'payment_ids' in request.form:
+            data['payment_ids'] = request.form.getlist('payment_ids')
+    elif not isinstance(data, dict):
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+    payment_type = data.get('payment_type', 'manual')
+    db = get_db()
+    try:
+        if data.get('payment_ids'):
+            if not isinstance(data['payment_ids'], list):
+                return jsonify({'error': 'payment_ids debe ser una lista de ids'}), 400
+            ids = [int(x) for x in data['payment_ids']]
+            cur = db.execute('SELECT id, status FROM payments WHERE id IN (SELECT value FROM json_each(?))',
+                             (json.dumps(ids),))
+        elif data.get('client_id'):
+            start = datetime.strptime(data.get('from'), '%Y-%m')
+            end = datetime.strptime(data.get('to', data.get('from')), '%Y-%m')
+            ids = None
+            cur = db.execute('''
+                SELECT id, status FROM payments
+                WHERE client_id=? AND (year, month) BETWEEN (?, ?) AND (?, ?)
+                ORDER BY year, month
+            ''', (int(data.get('client_id')), start.year, start.month, end.year, end.month))
+        else:
+            return jsonify({'error': 'Se requiere payment_ids o client_id con from/to'}), 400
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+
+    found = {r['id']: r['status'] for r in cur.fetchall()}
+    if ids is None:
+        ids = list(found)
+    paid_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    pending = [pid for pid, status in found.items() if status != 'paid']
+    try:
+        # Un solo UPDATE para todo el lote; el filtro por estado evita pisar pagos
+        # marcados por otro request desde la lectura y RETURNING indica cuáles cambiaron
+        updated = {r['id'] for r in db.execute('''
+            UPDATE payments SET status='paid', paid_date=?, payment_type=?
+            WHERE id IN (SELECT value FROM json_each(?)) AND status != 'paid'
+            RETURNING id
+        ''', (paid_date, payment_type, json.dumps(pending))).fetchall()}
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    results = {}
+    for pid in ids:
+        if pid not in found:
+            results[pid] = 'not_found'
+        elif pid in updated:
+            results[pid] = 'paid'
+        else:
+            results[pid] = 'already_paid'
+    return jsonify({'success': True, 'paid_date': paid_date, 'updated': len(updated), 'results': results}), 200
+
 @bp.route('/morosos')
 @login_required
 def morosos():
+    """Morosos paginados por deuda (keyset) con antigüedad de la deuda en tramos de 30/60/90+ días"""
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    after_debt = request.args.get('after_debt', type=float)
+    after_id = request.args.get('after_id', type=int)
     db = get_db()
-    cur = db.execute("SELECT c.*, SUM(CASE WHEN p.status='pending' THEN 1 ELSE 0 END) as pending_count, SUM(CASE WHEN p.status='pending' THEN p.amount ELSE 0 END) as total_debt FROM clients c JOIN payments p ON p.client_id=c.id GROUP BY c.id HAVING pending_count>0 ORDER BY total_debt DESC")
+    # La página sale del índice parcial de client_balances; la antigüedad se calcula
+    # sólo para esos clientes con el índice de cobertura sobre payments(status, client_id, ...)
+    keyset = ''
+    if after_id is not None and after_debt is not None:
+        keyset = 'AND total_debt <= :after_debt AND (total_debt < :after_debt OR client_id > :after_id)'
+    cur = db.execute(f'''
+        WITH page AS (
+            SELECT client_id, pending_count, total_debt
+            FROM client_balances
+            WHERE pending_count > 0 {keyset}
+            ORDER BY total_debt DESC, client_id
+            LIMIT :limit
+        ),
+        aged AS (
+            SELECT p.client_id, p.amount,
+                   julianday('now') - julianday(printf('%04d-%02d-01', p.year, p.month)) AS age
+            FROM page
+            JOIN payments p ON p.status = 'pending' AND p.client_id = page.client_id
+        )
+        SELECT c.*, page.pending_count, page.total_debt,
+               COALESCE(SUM(CASE WHEN aged.age < 30 THEN aged.amount END), 0) AS debt_current,
+               COALESCE(SUM(CASE WHEN aged.age >= 30 AND aged.age < 60 THEN aged.amount END), 0) AS debt_30,
+               COALESCE(SUM(CASE WHEN aged.age >= 60 AND aged.age < 90 THEN aged.amount END), 0) AS debt_60,
+               COALESCE(SUM(CASE WHEN aged.age >= 90 THEN aged.amount END), 0) AS debt_90
+        FROM page
+        JOIN clients c ON c.id = page.client_id
+        LEFT JOIN aged ON aged.client_id = page.client_id
+        GROUP BY page.client_id
+        ORDER BY page.total_debt DESC, page.client_id
+    ''', {'after_debt': after_debt, 'after_id': after_id, 'limit': per_page})
     rows = cur.fetchall()
-    return render_template('morosos.html', rows=rows)
+    next_page = None
+    if len(rows) == per_page:
+        last = rows[-1]
+        next_page = {'after_debt': repr(last['total_debt']), 'after_id': last['id'], 'per_page': per_page}
+    return render_template('morosos.html', rows=rows, next_page=next_page)
+def _csv_stream(cur, header, chunk_rows=500):
+    """Genera el CSV fila a fila desde el cursor, en bloques de `chunk_rows` filas"""
+    si = io.StringIO()
+    cw = csv.writer(si)
+    cw.writerow(header)
+    for i, r in enumerate(cur, 1):
+        cw.writerow([r[col] for col in header])
+        if i % chunk_rows == 0:
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate(0)
+    yield si.getvalue()
+
+def _csv_response(cur, header, filename):
+    return current_app.response_class(
+        stream_with_context(_csv_stream(cur, header)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/export/<int:client_id>')
 @login_required
 def export_client_payments(client_id):
     db = get_db()
     cur = db.execute('SELECT * FROM payments WHERE client_id=? ORDER BY year, month', (client_id,))
-    rows = cur.fetchall()
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['id','year','month','amount','status','paid_date','payment_type'])
-    for r in rows:
-        cw.writerow([r['id'], r['year'], r['month'], r['amount'], r['status'], r['paid_date'], r['payment_type']])
-    output = si.getvalue()
-    return current_app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=payments_client_{client_id}.csv'})
+    header = ['id','year','month','amount','status','paid_date','payment_type']
+    return _csv_response(cur, header, f'payments_client_{client_id}.csv')
+
+@bp.route('/export/all')
+@login_required
+def export_all_payments():
+    """Exporta el libro completo de pagos (filtros opcionales: year, status, client_id)"""
+    filters = []
+    params = []
+    year = request.args.get('year', type=int)
+    status = request.args.get('status')
+    client_id = request.args.get('client_id', type=int)
+    if year is not None:
+        filters.append('p.year=?')
+        params.append(year)
+    if status:
+        filters.append('p.status=?')
+        params.append(status)
+    if client_id is not None:
+        filters.append('p.client_id=?')
+        params.append(client_id)
+    where = ('WHERE ' + ' AND '.join(filters)) if filters else ''
+    db = get_db()
+    cur = db.execute(f'''
+        SELECT p.id, p.client_id, c.name AS client_name, p.year, p.month, p.amount,
+               p.status, p.paid_date, p.payment_type
+        FROM payments p
+        JOIN clients c ON c.id = p.client_id
+        {where}
+        ORDER BY p.client_id, p.year, p.month
+    ''', params)
+    header = ['id','client_id','client_name','year','month','amount','status','paid_date','payment_type']
+    suffix = f'_{year}' if year is not None else ''
+    return _csv_response(cur, header, f'payments_all{suffix}.csv')
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
 @bp.route('/excel/<int:client_id>')
 @login_required
 def excel(client_id):
-    db = get_db()
-    cur = db.execute('SELECT * FROM payments WHERE client_id=? ORDER BY year, month', (client_id,))
-    rows = [dict(r) for r in cur.fetchall()]
-    out_path = os.path.join(current_app.config['REPORT_FOLDER'], f'payments_{client_id}.xlsx')
-    os.makedirs(current_app.config['REPORT_FOLDER'], exist_ok=True)
-    payments_to_xlsx(rows, out_path)
-    return send_file(out_path, as_attachment=True)
+    """XLSX de un cliente; con ?by=year se crea una hoja por año"""
+    group_columns = ('year',) if request.args.get('by') == 'year' else None
+    return _xlsx_response('SELECT * FROM payments WHERE client_id=? ORDER BY year, month', (client_id,),
+                          group_columns, f'payments_{client_id}.xlsx')
+
+@bp.route('/excel/all')
+@login_required
+def excel_all():
+    """XLSX de todos los clientes, una hoja por año (por defecto) o por cliente (?by=client)"""
+    year = request.args.get('year', type=int)
+    by_client = request.args.get('by') == 'client'
+    order = 'p.client_id, p.year, p.month' if by_client else 'p.year, p.client_id, p.month'
+    where = 'WHERE p.year=?' if year is not None else ''
+    sql = f'''
+        SELECT p.*, c.name AS client_name
+        FROM payments p
+        JOIN clients c ON c.id = p.client_id
+        {where}
+        ORDER BY {order}
+    '''
+    group_columns = ('client_id', 'client_name') if by_client else ('year',)
+    suffix = f'_{year}' if year is not None else ''
+    return _xlsx_response(sql, (year,) if year is not None else (), group_columns, f'payments_all{suffix}.xlsx')
+
+def _xlsx_response(sql, params, group_columns, download_name):
+    """Genera el XLSX en el pool de renderizado (lee la base desde el proceso que lo escribe)"""
+    try:
+        data = render_pool.run(payments_query_xlsx, current_app.config['DATABASE'], sql, params,
+                               group_columns, None, current_app.config['SQLITE_PRAGMAS'])
+    except render_pool.RenderTimeout:
+        return busy_response()
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=download_name, mimetype=XLSX_MIMETYPE)
+
+def _invoice_folder():
+    return current_app.config.get('INVOICE_CACHE_FOLDER') or os.path.join(current_app.config['REPORT_FOLDER'], 'invoices')
+
 @bp.route('/invoice/<int:client_id>')
 @login_required
 def invoice(client_id):
@@ -156,7 +341,42 @@ def invoice(client_id):
     client = dict(cur.fetchone())
     cur = db.execute("SELECT * FROM payments WHERE client_id=? AND status='paid' ORDER BY year,month", (client_id,))
     payments = [dict(x) for x in cur.fetchall()]
-    out_path = os.path.join(current_app.config['REPORT_FOLDER'], f'invoice_{client_id}.pdf')
-    os.makedirs(current_app.config['REPORT_FOLDER'], exist_ok=True)
-    invoice_pdf(client, payments, out_path)
-    return send_file(out_path, as_attachment=True)
\ No newline at end of file
+    try:
+        path = cached_invoice(_invoice_folder(), client, payments)
+    except render_pool.RenderTimeout:
+        return busy_response()
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f'invoice_{client_id}.pdf')
+
+@bp.route('/invoices.zip')
+@login_required
+def invoices_zip():
+    """Facturas de todos los clientes activos (o ?client_ids=1,2,3; ?active=0 incluye inactivos) en un ZIP"""
+    filters = []
+    params = []
+    if 'client_ids' in request.args:
+        # Un filtro inválido no debe convertirse en "todos los clientes"
+        parts = [x.strip() for x in request.args['client_ids'].split(',') if x.strip()]
+        if not parts or not all(x.isdigit() for x in parts):
+            return jsonify({'error': 'client_ids debe ser una lista de ids separados por coma'}), 400
+        ids = [int(x) for x in parts]
+        filters.append(f"c.id IN ({','.join('?' * len(ids))})")
+        params.extend(ids)
+    if request.args.get('active', '1') != '0':
+        filters.append('c.active=1')
+    where = ('WHERE ' + ' AND '.join(filters)) if filters else ''
+    db = get_db()
+    clients = [dict(r) for r in db.execute(f'SELECT * FROM clients c {where} ORDER BY c.id', params)]
+    by_client = {c['id']: [] for c in clients}
+    cur = db.execute(f"""
+        SELECT p.* FROM payments p JOIN clients c ON c.id = p.client_id
+        {where} {'AND' if where else 'WHERE'} p.status='paid'
+        ORDER BY p.client_id, p.year, p.month
+    """, params)
+    for p in cur:
+        by_client[p['client_id']].append(dict(p))
+    jobs = [(c, by_client[c['id']]) for c in clients]
+    stream = invoices_zip_stream(_invoice_folder(), jobs, current_app.config.get('RENDER_TIMEOUT'))
+    return current_app.response_class(
+        stream, mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=invoices.zip'}
+    )
@@ -0,0 +1,249 @@
+from flask import Blueprint, request, jsonify, session, redirect, url_for
+from ..db import get_db
+from ..utils.tabular import read_rows, pick, parse_amount, parse_date
+from ..utils.phones import to_e164
+from collections import defaultdict, deque
+from datetime import datetime
+import json
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('reconciliation', __name__, url_prefix='/reconciliation')
+
+def login_required(f):
+    from functools import wraps
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if 'admin' not in session:
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return wrapper
+
+# Columnas reconocidas en los extractos (encabezados normalizados)
+DATE_COLUMNS = ('fecha', 'date', 'fecha_operacion', 'fecha_valor')
+AMOUNT_COLUMNS = ('monto', 'amount', 'importe', 'abono', 'credito', 'deposito')
+PHONE_COLUMNS = ('telefono', 'phone', 'celular', 'movil')
+NAME_COLUMNS = ('nombre', 'name', 'cliente', 'ordenante', 'remitente')
+DESCRIPTION_COLUMNS = ('descripcion', 'description', 'concepto', 'referencia', 'detalle', 'glosa')
+
+def _name_key(value):
+    if not value:
+        return None
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9 ]', ' ', text.lower())).strip() or None
+
+def _flag(value):
+    """true/1/on/si (formulario) o true (JSON)"""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'on', 'si', 'sí', 'yes')
+
+def _cents(amount):
+    return int(round(amount * 100))
+
+def _build_index(db):
+    """
+    Índice en memoria de lo pendiente: (teléfono|nombre, monto en centavos) -> cola de
+    pagos ordenada del más antiguo al más reciente.
+    """
+    index = defaultdict(deque)
+    cur = db.execute('''
+        SELECT 'payment' AS kind, p.id, c.phone_e164, c.phone, c.name, p.amount, p.year, p.month, 0 AS number
+        FROM payments p JOIN clients c ON c.id = p.client_id
+        WHERE p.status = 'pending'
+        UNION ALL
+        SELECT 'plan' AS kind, pp.id, c.phone_e164, c.phone, c.name, pp.amount, pp.year, pp.month, pp.payment_number
+        FROM payment_plan_payments pp JOIN clients c ON c.id = pp.client_id
+        WHERE pp.paid = 0
+        ORDER BY year, month, kind, number
+    ''')
+    phones = {}
+    for kind, pid, phone_e164, phone, name, amount, *_ in cur:
+        entry = (kind, pid)
+        cents = _cents(amount)
+        if phone_e164 is None and phone:
+            # Clientes cargados sin phone_e164 (p. ej. insertados fuera de la app)
+            if phone not in phones:
+                phones[phone] = to_e164(phone)
+            phone_e164 = phones[phone]
+        if phone_e164:
+            index[('phone', phone_e164, cents)].append(entry)
+        name_key = _name_key(name)
+        if name_key:
+            index[('name', name_key, cents)].append(entry)
+    return index
+
+def _take(index, key, used):
+    """Saca de la cola el pago pendiente más antiguo que aún no fue asignado"""
+    queue = index.get(key)
+    while queue:
+        entry = queue.popleft()
+        if entry not in used:
+            return entry
+    return None
+
+@bp.route('/import', methods=['POST'])
+@login_required
+def import_statement():
+    """
+    Concilia un extracto bancario o de caja (CSV/XLSX) contra los pagos pendientes.
+    Las líneas sin coincidencia quedan en la cola de revisión.
+    """
+    f = request.files.get('file')
+    if f is None or not f.filename:
+        return jsonify({'error': 'Se requiere un archivo'}), 400
+    payment_type = request.form.get('payment_type', 'banco')
+    batch = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{f.filename}"
+    db = get_db()
+
+    index = _build_index(db)
+    used = set()
+    matched = []
+    unmatched = []
+    skipped = 0
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    try:
+        rows = read_rows(f.stream, f.filename)
+        for line_number, row in enumerate(rows, 2):
+            amount = parse_amount(pick(row, *AMOUNT_COLUMNS))
+            if amount is None or amount <= 0:
+                skipped += 1
+                continue
+            line_date = parse_date(pick(row, *DATE_COLUMNS))
+            phone = pick(row, *PHONE_COLUMNS)
+            name = pick(row, *NAME_COLUMNS)
+            description = pick(row, *DESCRIPTION_COLUMNS)
+            cents = _cents(amount)
+
+            entry = None
+            phone_key = to_e164(phone)
+            if phone_key:
+                entry = _take(index, ('phone', phone_key, cents), used)
+            if entry is None and _name_key(name):
+                entry = _take(index, ('name', _name_key(name), cents), used)
+
+            queue_row = (batch, line_number, line_date, amount,
+                         None if phone is None else str(phone), name,
+                         description, json.dumps(row, default=str), now)
+            if entry is None:
+                unmatched.append(queue_row)
+                continue
+            used.add(entry)
+            matched.append((entry, line_date, queue_row))
+    except Exception as e:
+        logger.exception("Error leyendo extracto %s", f.filename)
+        return jsonify({'error': f'No se pudo leer el archivo: {e}'}), 400
+
+    paid_payments = paid_plans = 0
+    try:
+        for (kind, target_id), line_date, queue_row in matched:
+            if kind == 'payment':
+                cur = db.execute('''
+                    UPDATE payments SET status='paid', paid_date=?, payment_type=?
+                    WHERE id=? AND status='pending'
+                ''', (f"{line_date} 00:00:00" if line_date else now, payment_type, target_id))
+            else:
+                cur = db.execute('''
+                    UPDATE payment_plan_payments SET paid=1, paid_date=?, updated_at=datetime('now')
+                    WHERE id=? AND paid=0
+                ''', (line_date or now[:10], target_id))
+            if cur.rowcount == 0:
+                # Pagado por otro request desde que se armó el índice: la línea va a revisión
+                unmatched.append(queue_row)
+            elif kind == 'payment':
+                paid_payments += 1
+            else:
+                paid_plans += 1
+        db.executemany('''
+            INSERT INTO reconciliation_queue
+            (batch, line_number, line_date, amount, phone, name, description, raw, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', unmatched)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception("Error aplicando conciliación %s", batch)
+        return jsonify({'error': str(e)}), 500
+
+    logger.info("Conciliación %s: %d pagos, %d cuotas, %d sin coincidencia",
+                batch, paid_payments, paid_plans, len(unmatched))
+    return jsonify({
+        'ok': True,
+        'batch': batch,
+        'matched_payments': paid_payments,
+        'matched_plan_payments': paid_plans,
+        'unmatched': len(unmatched),
+        'skipped': skipped
+    }), 200
+
+@bp.route('/queue', methods=['GET'])
+@login_required
+def queue():
+    """Líneas pendientes de revisión (paginado con after_id y limit)"""
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    status = request.args.get('status', 'pending')
+    db = get_db()
+    cur = db.execute('''
+        SELECT id, batch, line_number, line_date, amount, phone, name, description, status,
+               payment_id, plan_payment_id, created_at, resolved_at
+        FROM reconciliation_queue
+        WHERE status=? AND id>?
+        ORDER BY id
+        LIMIT ?
+    ''', (status, after_id, limit))
+    rows = [dict(r) for r in cur.fetchall()]
+    return jsonify({'items': rows, 'next_after_id': rows[-1]['id'] if len(rows) == limit else None})
+
+@bp.route('/queue/<int:item_id>/resolve', methods=['POST'])
+@login_required
+def resolve(item_id):
+    """
+    Resuelve una línea de la cola.
+    JSON: payment_id o plan_payment_id para aplicarla a un pago, o dismiss: true para descartarla.
+    """
+    data = request.get_json(silent=True) or request.form
+    db = get_db()
+    item = db.execute('SELECT * FROM reconciliation_queue WHERE id=?', (item_id,)).fetchone()
+    if item is None:
+        return jsonify({'error': 'Línea no encontrada'}), 404
+    if item['status'] != 'pending':
+        return jsonify({'error': 'La línea ya fue resuelta'}), 409
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    paid_date = f"{item['line_date']} 00:00:00" if item['line_date'] else now
+    payment_id = data.get('payment_id')
+    plan_payment_id = data.get('plan_payment_id')
+    if payment_id:
+        cur = db.execute('''
+            UPDATE payments SET status='paid', paid_date=?, payment_type=?
+            WHERE id=? AND status='pending'
+        ''', (paid_date, data.get('payment_type', 'banco'), payment_id))
+        status = 'matched'
+    elif plan_payment_id:
+        cur = db.execute('''
+            UPDATE payment_plan_payments SET paid=1, paid_date=?, updated_at=datetime('now')
+            WHERE id=? AND paid=0
+        ''', (paid_date[:10], plan_payment_id))
+        status = 'matched'
+    elif _flag(data.get('dismiss')):
+        cur = None
+        status = 'dismissed'
+    else:
+        return jsonify({'error': 'Se requiere payment_id, plan_payment_id o dismiss'}), 400
+
+    if cur is not None and cur.rowcount == 0:
+        db.rollback()
+        return jsonify({'error': 'El pago no existe o ya está pagado'}), 409
+
+    db.execute('''
+        UPDATE reconciliation_queue
+        SET status=?, payment_id=?, plan_payment_id=?, resolved_at=?
+        WHERE id=?
+    ''', (status, payment_id, plan_payment_id, now, item_id))
+    db.commit()
+    return jsonify({'ok': True, 'status': status})
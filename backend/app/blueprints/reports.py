@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, session, redirect, url_for, current_app
-from ..db import get_db
-import os
-import matplotlib
-matplotlib.use('Agg')
+from flask import Blueprint, render_template, session, redirect, url_for, current_app, request, abort
+import logging
+from ..db import get_db, change_token
+from ..utils.http import conditional, busy_response
+from ..utils import charts, render_pool
 bp = Blueprint('reports', __name__, url_prefix='/reports')
+logger = logging.getLogger(__name__)
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -12,64 +13,66 @@ def login_required(f):
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return wrapper
+# Los PNG se piden con ?v=<versión de datos>: esa URL no cambia nunca de contenido
+CHART_MAX_AGE = 86400
+def _client_chart_data(db, client_id):
+    cur = db.execute('SELECT year, month, status, COUNT(*) as cnt FROM payments WHERE client_id=? GROUP BY year, month, status ORDER BY year, month', (client_id,))
+    seen = {}
+    for r in cur.fetchall():
+        key = f"{r['year']}-{int(r['month']):02d}"
+        if key not in seen: seen[key]={'paid':0,'pending':0}
+        if r['status']=='paid': seen[key]['paid']+=r['cnt']
+        else: seen[key]['pending']+=r['cnt']
+    labels = sorted(seen.keys())[-24:]
+    return labels, [seen[k]['paid'] for k in labels], [seen[k]['pending'] for k in labels]
+def _global_chart_data(db):
+    # revenue_rollup: una fila por mes, sin recorrer payments
+    cur = db.execute("SELECT year, SUM(paid_amount) as total_paid, SUM(pending_amount) as total_pending FROM revenue_rollup WHERE source='payments' GROUP BY year ORDER BY year")
+    rows = cur.fetchall()
+    return [r['year'] for r in rows], [r['total_paid'] for r in rows], [r['total_pending'] for r in rows]
 @bp.route('/client/<int:client_id>')
 @login_required
+@conditional
 def client_report(client_id):
     db = get_db()
     cur = db.execute('SELECT * FROM clients WHERE id=?', (client_id,))
     client = cur.fetchone()
-    cur = db.execute('SELECT year, month, status, COUNT(*) as cnt FROM payments WHERE client_id=? GROUP BY year, month, status ORDER BY year, month', (client_id,))
-    rows = cur.fetchall()
-    labels=[]; paid=[]; pending=[]; seen={}
-    for r in rows:
-        key = f"{r['year']}-{int(r['month']):02d}"
-        if key not in seen: seen[key]={'paid':0,'pending':0}
-        if r['status']=='paid': seen[key]['paid']+=r['cnt']
-        else: seen[key]['pending']+=r['cnt']
-    keys = sorted(seen.keys())
-    labels = keys[-24:]
-    paid = [seen[k]['paid'] for k in labels]
-    pending = [seen[k]['pending'] for k in labels]
-    img_name = f"client_{client_id}_summary.png"
-    img_path = os.path.join(current_app.root_path, '..', current_app.static_folder, 'reports', img_name)
-    try:
-        import matplotlib.pyplot as plt
-        plt.figure(figsize=(10,3))
-        x = range(len(labels))
-        plt.bar(x, paid, label='pagado')
-        plt.bar(x, pending, bottom=paid, label='pendiente')
-        plt.xticks(x, labels, rotation=45, ha='right', fontsize=8)
-        plt.legend()
-        plt.tight_layout()
-        os.makedirs(os.path.dirname(img_path), exist_ok=True)
-        plt.savefig(img_path)
-        plt.close()
-    except Exception:
-        img_path=None
-    return render_template('report_client.html', client=client, img=('/static/reports/'+img_name) if img_path else None)
+    version, _ = change_token(db)
+    img = url_for('reports.chart', name='client', client_id=client_id, v=version)
+    return render_template('report_client.html', client=client, img=img)
 @bp.route('/global')
 @login_required
+@conditional
 def global_report():
+    version, _ = change_token(get_db())
+    return render_template('report_global.html', img=url_for('reports.chart', name='global', v=version))
+@bp.route('/charts/<name>.png')
+@login_required
+@conditional
+def chart(name):
+    """PNG de un gráfico, desde el caché LRU si ya se generó para esta versión de datos"""
     db = get_db()
-    cur = db.execute('SELECT year, SUM(CASE WHEN status=\'paid\' THEN amount ELSE 0 END) as total_paid, SUM(CASE WHEN status=\'pending\' THEN amount ELSE 0 END) as total_pending FROM payments GROUP BY year ORDER BY year')
-    rows = cur.fetchall()
-    years = [r['year'] for r in rows]
-    img_name = 'global_summary.png'
-    img_path = os.path.join(current_app.root_path, '..', current_app.static_folder, 'reports', img_name)
+    version, _ = change_token(db)
+    if name == 'client':
+        client_id = request.args.get('client_id', type=int)
+        if client_id is None:
+            abort(400)
+        key = ('client', client_id, version)
+        render = lambda: render_pool.run(charts.client_summary_png, *_client_chart_data(db, client_id))
+    elif name == 'global':
+        key = ('global', None, version)
+        render = lambda: render_pool.run(charts.global_summary_png, *_global_chart_data(db))
+    else:
+        abort(404)
     try:
-        import matplotlib.pyplot as plt
-        paid = [r['total_paid'] for r in rows]
-        pending = [r['total_pending'] for r in rows]
-        plt.figure(figsize=(6,3))
-        x = range(len(years))
-        plt.plot(x, paid, marker='o', label='pagado')
-        plt.plot(x, pending, marker='o', label='pendiente')
-        plt.xticks(x, years)
-        plt.legend()
-        plt.tight_layout()
-        os.makedirs(os.path.dirname(img_path), exist_ok=True)
-        plt.savefig(img_path)
-        plt.close()
+        png = charts.cached_chart(key, render)
+    except render_pool.RenderTimeout:
+        return busy_response()
     except Exception:
-        img_path=None
-    return render_template('report_global.html', img=('/static/reports/'+img_name) if img_path else None)
+        # Un fallo al graficar no debe romper la página del reporte: queda sin gráfico
+        logger.exception("Error generando el gráfico %s", name)
+        return busy_response()
+    response = current_app.response_class(png, mimetype='image/png')
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = f'private, max-age={CHART_MAX_AGE}, immutable'
+    return response
@@ -33,7 +33,7 @@ def enqueue():
     db = get_db()
     
     # Obtener teléfono del cliente
-    cur = db.execute('SELECT phone, name FROM clients WHERE id=?', (client_id,))
+    cur = db.execute('SELECT COALESCE(phone_e164, phone) AS phone, name FROM clients WHERE id=?', (client_id,))
     client = cur.fetchone()
     
     if not client:
@@ -95,14 +95,19 @@ def send_bulk():
     
     db = get_db()
     
-    # Obtener clientes con pagos pendientes
+    # Clientes con pagos pendientes (client_balances) y su primer pago pendiente del año
     cur = db.execute('''
-        SELECT DISTINCT c.id, c.name, c.phone, c.monthly_amount
-        FROM clients c
-        JOIN payments p ON p.client_id = c.id
-        WHERE c.active = 1 
-        AND p.status = 'pending'
-        AND p.year = ?
+        SELECT c.id, c.name, COALESCE(c.phone_e164, c.phone) AS phone, c.monthly_amount, p.month, p.amount
+        FROM client_balances b
+        JOIN clients c ON c.id = b.client_id
+        JOIN payments p ON p.id = (
+            SELECT id FROM payments
+            WHERE client_id = c.id AND status = 'pending' AND year = ?
+            ORDER BY month
+            LIMIT 1
+        )
+        WHERE b.pending_count > 0
+        AND c.active = 1
         AND c.phone IS NOT NULL
         AND c.phone != ''
     ''', (year,))
@@ -114,20 +119,6 @@ def send_bulk():
     results = []
     
     for client in clients:
-        # Obtener primer pago pendiente
-        cur = db.execute('''
-            SELECT month, amount 
-            FROM payments 
-            WHERE client_id = ? AND status = 'pending' AND year = ?
-            ORDER BY month
-            LIMIT 1
-        ''', (client['id'], year))
-        
-        payment = cur.fetchone()
-        
-        if not payment:
-            continue
-        
         # Construir mensaje
         month_names = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
                       'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
@@ -135,8 +126,8 @@ def send_bulk():
         message = f"""Hola {client['name']}, 👋
 
 Este es un recordatorio de tu pago pendiente:
-💰 Monto: ${payment['amount']}
-📅 Mes: {month_names[payment['month'] - 1]}
+💰 Monto: ${client['amount']}
+📅 Mes: {month_names[client['month'] - 1]}
 
 Por favor, realiza tu pago a la brevedad.
 ¡Gracias por tu preferencia! 🙏"""
@@ -1,382 +1,162 @@
 import sqlite3
 import os
-from flask import g
-from werkzeug.security import generate_password_hash
+import threading
+import logging
+from datetime import datetime, timezone
+from flask import g, current_app, has_app_context
 
 DATABASE = os.path.join(os.getcwd(), 'sistemapagos.db')
 
+# Pragmas aplicados a cada conexión nueva (configurables con SQLITE_PRAGMAS)
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+    'cache_size': -16000,       # en KiB (~16 MB)
+    'mmap_size': 134217728,     # 128 MB
+}
+
+_local = threading.local()
+
+logger = logging.getLogger(__name__)
+
+# Tablas y columnas que los endpoints asumen presentes (verificadas al iniciar)
+REQUIRED_SCHEMA = {
+    'clients': {'id', 'name', 'phone', 'monthly_amount', 'signup_date', 'active'},
+    'payments': {'id', 'client_id', 'year', 'month', 'amount', 'status', 'paid_date', 'payment_type'},
+    'payment_plan_config': {'client_id', 'month', 'year', 'payments_count', 'monthly_amount'},
+    'payment_plan_payments': {'client_id', 'month', 'year', 'payment_number', 'amount', 'paid', 'paid_date'},
+}
+
+def connect(path=None, pragmas=None):
+    """Abre una conexión nueva a SQLite con los pragmas configurados"""
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+    timeout = int(settings.get('busy_timeout') or 0) / 1000.0
+    conn = sqlite3.connect(path or DATABASE, timeout=timeout)
+    conn.row_factory = sqlite3.Row
+    for name, value in settings.items():
+        if value is not None:
+            conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def _config():
+    """Ruta y pragmas de la app actual (o los valores por defecto)"""
+    if has_app_context():
+        return (current_app.config.get('DATABASE', DATABASE),
+                current_app.config.get('SQLITE_PRAGMAS'),
+                current_app.config.get('SQLITE_REUSE_CONNECTIONS', True))
+    return DATABASE, None, True
+
+def _thread_connection(path, pragmas):
+    """Devuelve la conexión reutilizable del hilo actual para `path`"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect(path, pragmas)
+    return conn
+
 def get_db():
     """Obtiene la conexión a la base de datos del contexto de Flask"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        path, pragmas, reuse = _config()
+        if reuse:
+            db = _thread_connection(path, pragmas)
+        else:
+            db = connect(path, pragmas)
+        g._database = db
     return db
 
 def close_connection(exception):
-    """Cierra la conexión a la base de datos"""
-    db = getattr(g, '_database', None)
-    if db is not None:
+    """Libera la conexión al terminar el request.
+
+    Las conexiones reutilizables se devuelven al hilo sin transacciones
+    abiertas; el resto se cierran.
+    """
+    db = g.pop('_database', None)
+    if db is None:
+        return
+    _, _, reuse = _config()
+    if not reuse:
         db.close()
+        return
+    try:
+        if db.in_transaction:
+            db.rollback()
+    except sqlite3.Error:
+        close_thread_connections()
+
+def close_thread_connections():
+    """Cierra todas las conexiones abiertas por el hilo actual"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    connections.clear()
+
+def change_token(conn):
+    """Versión actual de los datos como (token, última modificación en UTC).
+
+    Combina el último id de historial_cambios (los triggers registran cada cambio
+    en clients, payments y uploads) con el contador data_version de los planes de
+    pago. Son dos lecturas por clave primaria: no toca las tablas de pagos.
+    """
+    row = conn.execute("""
+        SELECT (SELECT id FROM historial_cambios ORDER BY id DESC LIMIT 1),
+               (SELECT fecha_hora FROM historial_cambios ORDER BY id DESC LIMIT 1),
+               version, changed_at
+        FROM data_version WHERE id = 1
+    """).fetchone()
+    last_id, last_change, version, changed_at = row if row else (None, None, 0, None)
+    modified = max(filter(None, (last_change, changed_at)), default=None)
+    if modified:
+        modified = datetime.strptime(modified, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return f'{last_id or 0}.{version}', modified
 
 def init_db(app=None):
-    """Inicializa la base de datos y ejecuta migraciones"""
+    """Aplica las migraciones pendientes (no hace nada si el esquema está al día)"""
+    from .migrations import migrate
     if app:
         with app.app_context():
-            _init()
-            _run_migrations()
+            path, pragmas, _ = _config()
+            migrate(path, pragmas)
     else:
-        _init()
-        _run_migrations()
+        migrate()
 
-def _init():
-    """Crea las tablas iniciales si no existen"""
-    conn = sqlite3.connect(DATABASE)
-    cur = conn.cursor()
-    
-    try:
-        # Habilitar foreign keys
-        cur.execute("PRAGMA foreign_keys = ON")
-        
-        # Main tables creation
-        cur.executescript(r"""
-            CREATE TABLE IF NOT EXISTS admins (
-                id INTEGER PRIMARY KEY, 
-                username TEXT UNIQUE NOT NULL, 
-                password TEXT NOT NULL, 
-                created_at TEXT NOT NULL
-            );
-            
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY, 
-                value TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS clients (
-                id INTEGER PRIMARY KEY, 
-                name TEXT NOT NULL, 
-                phone TEXT, 
-                monthly_amount REAL NOT NULL DEFAULT 0, 
-                signup_date TEXT NOT NULL, 
-                active INTEGER NOT NULL DEFAULT 1
-            );
-            
-            CREATE TABLE IF NOT EXISTS payments (
-                id INTEGER PRIMARY KEY, 
-                client_id INTEGER NOT NULL, 
-                year INTEGER NOT NULL, 
-                month INTEGER NOT NULL, 
-                amount REAL NOT NULL, 
-                status TEXT NOT NULL DEFAULT 'pending', 
-                paid_date TEXT, 
-                payment_type TEXT, 
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            );
-            
-            CREATE TABLE IF NOT EXISTS uploads (
-                id INTEGER PRIMARY KEY, 
-                client_id INTEGER NOT NULL, 
-                filename TEXT NOT NULL, 
-                stored_path TEXT NOT NULL, 
-                uploaded_at TEXT NOT NULL, 
-                thumb_path TEXT, 
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            );
-            
-            CREATE TABLE IF NOT EXISTS historial_cambios (
-                id INTEGER PRIMARY KEY, 
-                tabla TEXT NOT NULL, 
-                operacion TEXT NOT NULL, 
-                usuario TEXT, 
-                fecha_hora TEXT NOT NULL, 
-                old_values TEXT, 
-                new_values TEXT
-            );
-        """)
-        
-        # Tablas adicionales para planes de pago personalizados
-        cur.executescript(r"""
-            -- Configuración de planes de pago por mes
-            CREATE TABLE IF NOT EXISTS payment_plan_config (
-                id INTEGER PRIMARY KEY,
-                client_id INTEGER NOT NULL,
-                month INTEGER NOT NULL,
-                year INTEGER NOT NULL,
-                payments_count INTEGER NOT NULL DEFAULT 1,
-                monthly_amount REAL NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL,
-                updated_at TEXT,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE,
-                UNIQUE(client_id, month, year)
-            );
-            
-            -- Pagos individuales dentro de un mes (múltiples pagos por mes)
-            CREATE TABLE IF NOT EXISTS payment_plan_payments (
-                id INTEGER PRIMARY KEY,
-                client_id INTEGER NOT NULL,
-                month INTEGER NOT NULL,
-                year INTEGER NOT NULL,
-                payment_number INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                paid INTEGER NOT NULL DEFAULT 0,
-                paid_date TEXT,
-                created_at TEXT NOT NULL,
-                updated_at TEXT,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE,
-                UNIQUE(client_id, month, year, payment_number)
-            );
-            
-            -- Índices para mejorar rendimiento
-            CREATE INDEX IF NOT EXISTS idx_plan_config_client 
-            ON payment_plan_config(client_id, month, year);
-            
-            CREATE INDEX IF NOT EXISTS idx_plan_payments_client 
-            ON payment_plan_payments(client_id, month, year);
-            
-            CREATE INDEX IF NOT EXISTS idx_payments_client_date
-            ON payments(client_id, year, month);
-        """)
-        
-        # Tablas adicionales del sistema
-        cur.executescript(r"""
-            CREATE TABLE IF NOT EXISTS access_logs (
-                id INTEGER PRIMARY KEY,
-                username TEXT,
-                ip TEXT,
-                user_agent TEXT,
-                action TEXT,
-                created_at TEXT NOT NULL
-            );
-            
-            CREATE TABLE IF NOT EXISTS whatsapp_queue (
-                id INTEGER PRIMARY KEY,
-                client_id INTEGER,
-                message TEXT NOT NULL,
-                template TEXT,
-                attachment TEXT,
-                status TEXT NOT NULL DEFAULT 'pending',
-                attempts INTEGER NOT NULL DEFAULT 0,
-                scheduled_at TEXT,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            );
-        """)
-        
-        # Triggers para historial de cambios
-        cur.executescript(r"""
-            -- Triggers para la tabla clients
-            CREATE TRIGGER IF NOT EXISTS trg_clients_insert 
-            AFTER INSERT ON clients 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('clients','INSERT', COALESCE(NEW.id || '', 'system'), datetime('now'), NULL, 
-                       json_object('id', NEW.id, 'name', NEW.name, 'phone', NEW.phone, 
-                                  'monthly_amount', NEW.monthly_amount, 'signup_date', NEW.signup_date, 
-                                  'active', NEW.active)); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS trg_clients_update 
-            AFTER UPDATE ON clients 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('clients','UPDATE', COALESCE(NEW.id || '', 'system'), datetime('now'), 
-                       json_object('id', OLD.id, 'name', OLD.name, 'phone', OLD.phone, 
-                                  'monthly_amount', OLD.monthly_amount, 'signup_date', OLD.signup_date, 
-                                  'active', OLD.active), 
-                       json_object('id', NEW.id, 'name', NEW.name, 'phone', NEW.phone, 
-                                  'monthly_amount', NEW.monthly_amount, 'signup_date', NEW.signup_date, 
-                                  'active', NEW.active)); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS trg_clients_delete 
-            AFTER DELETE ON clients 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('clients','DELETE', COALESCE(OLD.id || '', 'system'), datetime('now'), 
-                       json_object('id', OLD.id, 'name', OLD.name, 'phone', OLD.phone, 
-                                  'monthly_amount', OLD.monthly_amount, 'signup_date', OLD.signup_date, 
-                                  'active', OLD.active), NULL); 
-            END;
-            
-            -- Triggers para la tabla payments
-            CREATE TRIGGER IF NOT EXISTS trg_payments_insert 
-            AFTER INSERT ON payments 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('payments','INSERT', COALESCE(NEW.client_id || '', 'system'), datetime('now'), NULL, 
-                       json_object('id', NEW.id, 'client_id', NEW.client_id, 'year', NEW.year, 
-                                  'month', NEW.month, 'amount', NEW.amount, 'status', NEW.status, 
-                                  'paid_date', NEW.paid_date, 'payment_type', NEW.payment_type)); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS trg_payments_update 
-            AFTER UPDATE ON payments 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('payments','UPDATE', COALESCE(NEW.client_id || '', 'system'), datetime('now'), 
-                       json_object('id', OLD.id, 'client_id', OLD.client_id, 'year', OLD.year, 
-                                  'month', OLD.month, 'amount', OLD.amount, 'status', OLD.status, 
-                                  'paid_date', OLD.paid_date, 'payment_type', OLD.payment_type), 
-                       json_object('id', NEW.id, 'client_id', NEW.client_id, 'year', NEW.year, 
-                                  'month', NEW.month, 'amount', NEW.amount, 'status', NEW.status, 
-                                  'paid_date', NEW.paid_date, 'payment_type', NEW.payment_type)); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS trg_payments_delete 
-            AFTER DELETE ON payments 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('payments','DELETE', COALESCE(OLD.client_id || '', 'system'), datetime('now'), 
-                       json_object('id', OLD.id, 'client_id', OLD.client_id, 'year', OLD.year, 
-                                  'month', OLD.month, 'amount', OLD.amount, 'status', OLD.status, 
-                                  'paid_date', OLD.paid_date, 'payment_type', OLD.payment_type), NULL); 
-            END;
-            
-            -- Triggers para la tabla uploads
-            CREATE TRIGGER IF NOT EXISTS trg_uploads_insert 
-            AFTER INSERT ON uploads 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('uploads','INSERT', COALESCE(NEW.client_id || '', 'system'), datetime('now'), NULL, 
-                       json_object('id', NEW.id, 'client_id', NEW.client_id, 'filename', NEW.filename, 
-                                  'stored_path', NEW.stored_path, 'uploaded_at', NEW.uploaded_at)); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS trg_uploads_delete 
-            AFTER DELETE ON uploads 
-            BEGIN 
-                INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values) 
-                VALUES('uploads','DELETE', COALESCE(OLD.client_id || '', 'system'), datetime('now'), 
-                       json_object('id', OLD.id, 'client_id', OLD.client_id, 'filename', OLD.filename, 
-                                  'stored_path', OLD.stored_path, 'uploaded_at', OLD.uploaded_at), NULL); 
-            END;
-            
-            -- Protección del historial (inmutable)
-            CREATE TRIGGER IF NOT EXISTS protect_historial_update 
-            BEFORE UPDATE ON historial_cambios 
-            BEGIN 
-                SELECT RAISE(ABORT, 'historial_cambios is immutable'); 
-            END;
-            
-            CREATE TRIGGER IF NOT EXISTS protect_historial_delete 
-            BEFORE DELETE ON historial_cambios 
-            BEGIN 
-                SELECT RAISE(ABORT, 'historial_cambios is immutable'); 
-            END;
-        """)
-        
-        conn.commit()
-        print("✅ Tablas creadas correctamente")
-        
-        # Crear admin por defecto si no existe
-        cur.execute("SELECT COUNT(*) FROM admins")
-        if cur.fetchone()[0] == 0:
-            pwd = generate_password_hash('admin')
-            cur.execute("INSERT INTO admins(username, password, created_at) VALUES (?, ?, datetime('now'))", 
-                       ('admin', pwd))
-            conn.commit()
-            print("✅ Usuario admin creado (usuario: admin, contraseña: admin)")
-    
-    except sqlite3.Error as e:
-        print(f"❌ Error al crear tablas: {str(e)}")
-        conn.rollback()
-    finally:
-        conn.close()
+def check_schema(path=None, pragmas=None):
+    """Auto-verificación al iniciar: confirma que existen las tablas y columnas requeridas.
 
-def _run_migrations():
+    Retorna la lista de problemas encontrados (vacía si todo está bien).
     """
-    Ejecuta migraciones para actualizar bases de datos existentes.
-    Esta función se ejecuta automáticamente después de _init().
-    """
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    migrations_applied = []
-    
+    conn = connect(path, pragmas)
+    problems = []
     try:
-        # MIGRACIÓN 1: Agregar columna custom_amount a payments
-        cursor.execute("PRAGMA table_info(payments)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'custom_amount' not in columns:
-            print("🔄 Ejecutando migración: agregar custom_amount...")
-            cursor.execute('ALTER TABLE payments ADD COLUMN custom_amount REAL')
-            
-            # Migrar datos existentes: copiar amount a custom_amount
-            cursor.execute('''
-                UPDATE payments 
-                SET custom_amount = amount 
-                WHERE custom_amount IS NULL
-            ''')
-            
-            conn.commit()
-            migrations_applied.append("custom_amount agregado a payments")
-            print("   ✅ custom_amount agregado")
-        
-        # MIGRACIÓN 2: Verificar que paid_date exista en payments
-        cursor.execute("PRAGMA table_info(payments)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'paid_date' not in columns:
-            print("🔄 Ejecutando migración: agregar paid_date...")
-            cursor.execute('ALTER TABLE payments ADD COLUMN paid_date TEXT')
-            conn.commit()
-            migrations_applied.append("paid_date agregado a payments")
-            print("   ✅ paid_date agregado")
-        
-        # MIGRACIÓN 3: Verificar que payment_type exista en payments
-        if 'payment_type' not in columns:
-            print("🔄 Ejecutando migración: agregar payment_type...")
-            cursor.execute('ALTER TABLE payments ADD COLUMN payment_type TEXT')
-            conn.commit()
-            migrations_applied.append("payment_type agregado a payments")
-            print("   ✅ payment_type agregado")
-        
-        # MIGRACIÓN 4: Actualizar pagos sin custom_amount
-        cursor.execute('''
-            UPDATE payments 
-            SET custom_amount = amount 
-            WHERE custom_amount IS NULL
-        ''')
-        conn.commit()
-        
-        # MIGRACIÓN 5: Crear índices si no existen
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_payments_status 
-            ON payments(status)
-        ''')
-        
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_payments_client_status
-            ON payments(client_id, status)
-        ''')
-        
-        conn.commit()
-        migrations_applied.append("Índices optimizados")
-        
-        # Resumen de migraciones
-        if migrations_applied:
-            print(f"✅ Migraciones completadas: {len(migrations_applied)}")
-            for migration in migrations_applied:
-                print(f"   - {migration}")
-        else:
-            print("ℹ️  No hay migraciones pendientes")
-    
-    except sqlite3.Error as e:
-        print(f"❌ Error en migraciones: {str(e)}")
-        conn.rollback()
-    except Exception as e:
-        print(f"❌ Error inesperado en migraciones: {str(e)}")
-        conn.rollback()
+        for table, required in REQUIRED_SCHEMA.items():
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if not columns:
+                problems.append(f"falta la tabla {table}")
+            elif required - columns:
+                problems.append(f"faltan columnas en {table}: {', '.join(sorted(required - columns))}")
+            else:
+                logger.debug("Tabla %s: %s", table, ', '.join(sorted(columns)))
     finally:
         conn.close()
+    for problem in problems:
+        logger.error("Esquema inválido: %s", problem)
+    return problems
 
-def verify_database_integrity():
+def verify_database_integrity(path=None):
     """
     Verifica la integridad de la base de datos.
     Útil para debugging.
     """
-    conn = sqlite3.connect(DATABASE)
+    conn = connect(path)
     cursor = conn.cursor()
     
     try:
@@ -423,6 +203,5 @@ def verify_database_integrity():
 # Ejecutar verificación solo si se ejecuta directamente
 if __name__ == '__main__':
     print("🚀 Inicializando base de datos...")
-    _init()
-    _run_migrations()
+    init_db()
     verify_database_integrity()
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Informe del costo de importación al arrancar la app, basado en `python -X importtime`.
+
+Arranca create_app() en un intérprete nuevo (base temporal, sin pool de renderizado)
+y muestra los módulos más costosos y si se cargó alguna librería pesada.
+
+Uso:
+    python -m backend.app.importtime [--top N] [--budget-ms MS]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Librerías que sólo deben cargarse al usarse (reportes, PDF, XLSX, envíos)
+HEAVY_MODULES = ('matplotlib', 'reportlab', 'openpyxl', 'numpy', 'PIL', 'requests')
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+_STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from backend.app import create_app
+create_app({'DATABASE': sys.argv[1]})
+print('create_app_ms=%.1f' % ((time.perf_counter() - start) * 1000))
+"""
+
+
+def parse_importtime(output):
+    """Líneas de -X importtime -> [(módulo, propio_us, acumulado_us), ...]"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # encabezado
+        modules.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return modules
+
+
+def measure(db_path=None):
+    """Mide el arranque en frío de create_app() en un proceso aparte.
+
+    Retorna un dict con create_app_ms, modules (ver parse_importtime) y heavy
+    (librerías de HEAVY_MODULES que se importaron).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, RENDER_WORKERS='0', PYTHONDONTWRITEBYTECODE='1')
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _STARTUP_SCRIPT, db_path or os.path.join(tmp, 'startup.db')],
+            cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+    create_app_ms = None
+    for line in result.stdout.splitlines():
+        if line.startswith('create_app_ms='):
+            create_app_ms = float(line.split('=', 1)[1])
+    modules = parse_importtime(result.stderr)
+    loaded = {name.split('.')[0] for name, _, _ in modules}
+    return {
+        'create_app_ms': create_app_ms,
+        'modules': modules,
+        'heavy': [m for m in HEAVY_MODULES if m in loaded],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Costo de importación al arrancar Sistema Pagos')
+    parser.add_argument('--top', type=int, default=20, help='Cantidad de módulos a mostrar')
+    parser.add_argument('--budget-ms', type=float, help='Falla (código 1) si create_app() tarda más')
+    args = parser.parse_args(argv)
+
+    report = measure()
+    print(f"⏱️  create_app(): {report['create_app_ms']:.0f} ms, {len(report['modules'])} módulos importados")
+    print(f"{'acumulado ms':>13} {'propio ms':>10}  módulo")
+    for name, self_us, cumulative_us in sorted(report['modules'], key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:10.1f}  {name}")
+    if report['heavy']:
+        print(f"⚠️  Librerías pesadas cargadas al arrancar: {', '.join(report['heavy'])}")
+    if args.budget_ms is not None and report['create_app_ms'] > args.budget_ms:
+        print(f"❌ Supera el presupuesto de {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+"""
+Logging asíncrono de la aplicación.
+
+Los módulos usan ``logging.getLogger(__name__)``. En el hilo del request sólo
+se encola el registro (QueueHandler); el formateo y la escritura a consola o
+archivo los hace un QueueListener en un hilo aparte.
+
+Configuración (app.config):
+    LOG_LEVEL: DEBUG, INFO, WARNING, ERROR (por defecto INFO)
+    LOG_FILE:  ruta opcional de un archivo de log adicional
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_queue_handler = None
+_logger = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no aplica el formato (fecha, nivel...) en el hilo que loguea"""
+
+    def prepare(self, record):
+        # Los argumentos se resuelven ahora, como hace QueueHandler: un dict o una fila
+        # modificados después del logger.info(...) no deben cambiar el mensaje
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(app):
+    """Conecta el logger del paquete de la app a una cola atendida por un hilo aparte"""
+    global _listener, _queue_handler, _logger
+
+    # create_app() puede llamarse varias veces (tests): reemplazar la configuración anterior
+    stop_logging()
+
+    logger = _logger = logging.getLogger(app.import_name)
+    level = str(app.config.get('LOG_LEVEL', 'INFO')).upper()
+    invalid_level = not isinstance(logging.getLevelName(level), int)
+    logger.setLevel(logging.INFO if invalid_level else level)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if app.config.get('LOG_FILE'):
+        handlers.append(logging.FileHandler(app.config['LOG_FILE'], encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if invalid_level:
+        logger.warning("LOG_LEVEL inválido (%s); se usa INFO", level)
+    return logger
+
+
+def stop_logging():
+    """Vacía la cola y detiene el hilo de logging"""
+    global _listener, _queue_handler, _logger
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _logger is not None:
+        _logger.removeHandler(_queue_handler)
+        _logger = _queue_handler = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,219 @@
+"""
+Tareas de mantenimiento de tablas derivadas.
+
+Uso offline:
+    python -m backend.app.maintenance balances [--check] [--db RUTA]
+    python -m backend.app.maintenance rollup [--check] [--db RUTA]
+    python -m backend.app.maintenance backfill-payments [--include-inactive] [--db RUTA]
+"""
+import argparse
+from datetime import date
+from .db import connect, DATABASE
+
+# Tolerancia para comparar montos acumulados (REAL) por los triggers
+AMOUNT_TOLERANCE = 0.005
+
+CLIENT_BALANCES_AGGREGATE = """
+    SELECT client_id,
+           SUM(CASE WHEN status='pending' THEN 1 ELSE 0 END) AS pending_count,
+           SUM(CASE WHEN status='pending' THEN amount ELSE 0 END) AS total_debt,
+           SUM(CASE WHEN status='paid' THEN 1 ELSE 0 END) AS paid_count,
+           SUM(CASE WHEN status='paid' THEN amount ELSE 0 END) AS total_paid
+    FROM payments
+    GROUP BY client_id
+"""
+
+
+def rebuild_client_balances(conn):
+    """Recalcula client_balances desde payments (no hace commit)"""
+    conn.execute('DELETE FROM client_balances')
+    conn.execute(f'''
+        INSERT INTO client_balances(client_id, pending_count, total_debt, paid_count, total_paid)
+        {CLIENT_BALANCES_AGGREGATE}
+    ''')
+
+
+def client_balances_drift(conn):
+    """Filas de client_balances que no coinciden con payments.
+
+    Retorna una lista de (client_id, esperado, actual) donde cada valor es una
+    tupla (pending_count, total_debt, paid_count, total_paid).
+    """
+    expected = {r[0]: tuple(r[1:]) for r in conn.execute(CLIENT_BALANCES_AGGREGATE)}
+    actual = {r[0]: tuple(r[1:]) for r in conn.execute(
+        'SELECT client_id, pending_count, total_debt, paid_count, total_paid FROM client_balances')}
+    drift = []
+    for client_id in sorted(set(expected) | set(actual)):
+        exp = expected.get(client_id, (0, 0, 0, 0))
+        act = actual.get(client_id, (0, 0, 0, 0))
+        if (exp[0] != act[0] or exp[2] != act[2]
+                or abs(exp[1] - act[1]) > AMOUNT_TOLERANCE
+                or abs(exp[3] - act[3]) > AMOUNT_TOLERANCE):
+            drift.append((client_id, exp, act))
+    return drift
+
+
+REVENUE_ROLLUP_AGGREGATE = """
+    SELECT year, month, 'payments' AS source,
+           SUM(CASE WHEN status='paid' THEN 1 ELSE 0 END) AS paid_count,
+           SUM(CASE WHEN status='paid' THEN amount ELSE 0 END) AS paid_amount,
+           SUM(CASE WHEN status='pending' THEN 1 ELSE 0 END) AS pending_count,
+           SUM(CASE WHEN status='pending' THEN amount ELSE 0 END) AS pending_amount
+    FROM payments
+    GROUP BY year, month
+    UNION ALL
+    SELECT year, month, 'plans' AS source,
+           SUM(CASE WHEN paid=1 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN paid=1 THEN amount ELSE 0 END),
+           SUM(CASE WHEN paid=0 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN paid=0 THEN amount ELSE 0 END)
+    FROM payment_plan_payments
+    GROUP BY year, month
+"""
+
+
+def rebuild_revenue_rollup(conn):
+    """Recalcula revenue_rollup desde payments y payment_plan_payments (no hace commit)"""
+    conn.execute('DELETE FROM revenue_rollup')
+    conn.execute(f'''
+        INSERT INTO revenue_rollup(year, month, source, paid_count, paid_amount, pending_count, pending_amount)
+        {REVENUE_ROLLUP_AGGREGATE}
+    ''')
+
+
+def revenue_rollup_drift(conn):
+    """Filas de revenue_rollup que no coinciden con las tablas de pagos.
+
+    Retorna una lista de ((year, month, source), esperado, actual) donde cada valor
+    es una tupla (paid_count, paid_amount, pending_count, pending_amount).
+    """
+    expected = {tuple(r[:3]): tuple(r[3:]) for r in conn.execute(REVENUE_ROLLUP_AGGREGATE)}
+    actual = {tuple(r[:3]): tuple(r[3:]) for r in conn.execute(
+        'SELECT year, month, source, paid_count, paid_amount, pending_count, pending_amount FROM revenue_rollup')}
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        exp = expected.get(key, (0, 0, 0, 0))
+        act = actual.get(key, (0, 0, 0, 0))
+        if (exp[0] != act[0] or exp[2] != act[2]
+                or abs(exp[1] - act[1]) > AMOUNT_TOLERANCE
+                or abs(exp[3] - act[3]) > AMOUNT_TOLERANCE):
+            drift.append((key, exp, act))
+    return drift
+
+
+def backfill_payments(conn, client_id=None, active_only=True, until=None, after_id=None):
+    """
+    Crea los pagos pendientes faltantes desde el mes de alta de cada cliente hasta
+    `until` (date, por defecto hoy) con un único INSERT ... SELECT recursivo.
+    Los meses que ya tienen pago se omiten. No hace commit; retorna las filas creadas.
+
+    `client_id` limita a un cliente y `after_id` a los clientes con id mayor (importaciones).
+    """
+    until = until or date.today()
+    filters = ["signup_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*'"]
+    params = {'until': until.year * 12 + until.month}
+    if client_id is not None:
+        filters.append('id = :client_id')
+        params['client_id'] = client_id
+    if after_id is not None:
+        filters.append('id > :after_id')
+        params['after_id'] = after_id
+    if active_only:
+        filters.append('active = 1')
+    where = 'WHERE ' + ' AND '.join(filters)
+    cur = conn.execute(f'''
+        INSERT INTO payments(client_id, year, month, amount, status)
+        WITH RECURSIVE months(client_id, amount, y, m) AS (
+            SELECT id, monthly_amount,
+                   CAST(substr(signup_date, 1, 4) AS INTEGER),
+                   CAST(substr(signup_date, 6, 2) AS INTEGER)
+            FROM clients {where}
+            UNION ALL
+            SELECT client_id, amount,
+                   CASE WHEN m = 12 THEN y + 1 ELSE y END,
+                   CASE WHEN m = 12 THEN 1 ELSE m + 1 END
+            FROM months
+            WHERE y * 12 + m < :until
+        )
+        SELECT client_id, y, m, amount, 'pending'
+        FROM months
+        WHERE y * 12 + m <= :until
+        AND NOT EXISTS (
+            SELECT 1 FROM payments p
+            WHERE p.client_id = months.client_id AND p.year = months.y AND p.month = months.m
+        )
+    ''', params)
+    return cur.rowcount
+
+
+def _backfill_payments(args):
+    conn = connect(args.db)
+    try:
+        created = backfill_payments(conn, active_only=not args.include_inactive)
+        conn.commit()
+        print(f"✅ Pagos creados: {created}")
+        return 0
+    finally:
+        conn.close()
+
+
+def _balances(args):
+    conn = connect(args.db)
+    try:
+        drift = client_balances_drift(conn)
+        print(f"📊 client_balances: {len(drift)} clientes con diferencias")
+        for client_id, exp, act in drift[:20]:
+            print(f"   - cliente {client_id}: esperado {exp}, actual {act}")
+        if args.check:
+            return 1 if drift else 0
+        rebuild_client_balances(conn)
+        conn.commit()
+        print("✅ client_balances recalculada")
+        return 0
+    finally:
+        conn.close()
+
+
+def _rollup(args):
+    conn = connect(args.db)
+    try:
+        drift = revenue_rollup_drift(conn)
+        print(f"📊 revenue_rollup: {len(drift)} meses con diferencias")
+        for (year, month, source), exp, act in drift[:20]:
+            print(f"   - {year}-{month:02d} ({source}): esperado {exp}, actual {act}")
+        if args.check:
+            return 1 if drift else 0
+        rebuild_revenue_rollup(conn)
+        conn.commit()
+        print("✅ revenue_rollup recalculada")
+        return 0
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=DATABASE, help='Ruta de la base SQLite')
+    parser = argparse.ArgumentParser(description='Mantenimiento de la base de datos de Sistema Pagos')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    balances = sub.add_parser('balances', parents=[common], help='Recalcular client_balances desde payments')
+    balances.add_argument('--check', action='store_true', help='Sólo informar diferencias')
+    balances.set_defaults(func=_balances)
+
+    rollup = sub.add_parser('rollup', parents=[common],
+                            help='Recalcular revenue_rollup desde payments y payment_plan_payments')
+    rollup.add_argument('--check', action='store_true', help='Sólo informar diferencias')
+    rollup.set_defaults(func=_rollup)
+
+    backfill = sub.add_parser('backfill-payments', parents=[common],
+                              help='Crear los pagos mensuales faltantes de todos los clientes')
+    backfill.add_argument('--include-inactive', action='store_true', help='Incluir clientes inactivos')
+    backfill.set_defaults(func=_backfill_payments)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
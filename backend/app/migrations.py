@@ -0,0 +1,703 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración tiene un número y se registra en ``PRAGMA user_version``.
+Al iniciar la app sólo se lee la versión actual; si el esquema está al día
+no se ejecuta nada más. Las migraciones pendientes se aplican una sola vez,
+dentro de una transacción ``BEGIN IMMEDIATE`` que actúa como lock entre
+procesos.
+
+Uso offline:
+    python -m backend.app.migrations status [--db RUTA]
+    python -m backend.app.migrations upgrade [--db RUTA]
+"""
+import argparse
+import sqlite3
+import threading
+from werkzeug.security import generate_password_hash
+from .db import connect, DATABASE
+from .maintenance import rebuild_client_balances, rebuild_revenue_rollup
+from .utils.phones import backfill_phone_e164
+
+_lock = threading.Lock()
+
+SCHEMA_TABLES = r"""
+CREATE TABLE IF NOT EXISTS admins (
+    id INTEGER PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT,
+    monthly_amount REAL NOT NULL DEFAULT 0,
+    signup_date TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    paid_date TEXT,
+    payment_type TEXT,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    stored_path TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    thumb_path TEXT,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS historial_cambios (
+    id INTEGER PRIMARY KEY,
+    tabla TEXT NOT NULL,
+    operacion TEXT NOT NULL,
+    usuario TEXT,
+    fecha_hora TEXT NOT NULL,
+    old_values TEXT,
+    new_values TEXT
+);
+"""
+
+SCHEMA_PAYMENT_PLANS = r"""
+-- Configuración de planes de pago por mes
+CREATE TABLE IF NOT EXISTS payment_plan_config (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    payments_count INTEGER NOT NULL DEFAULT 1,
+    monthly_amount REAL NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE,
+    UNIQUE(client_id, month, year)
+);
+
+-- Pagos individuales dentro de un mes (múltiples pagos por mes)
+CREATE TABLE IF NOT EXISTS payment_plan_payments (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    payment_number INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    paid INTEGER NOT NULL DEFAULT 0,
+    paid_date TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE,
+    UNIQUE(client_id, month, year, payment_number)
+);
+
+-- Índices para mejorar rendimiento
+CREATE INDEX IF NOT EXISTS idx_plan_config_client
+ON payment_plan_config(client_id, month, year);
+
+CREATE INDEX IF NOT EXISTS idx_plan_payments_client
+ON payment_plan_payments(client_id, month, year);
+
+CREATE INDEX IF NOT EXISTS idx_payments_client_date
+ON payments(client_id, year, month);
+"""
+
+SCHEMA_SYSTEM = r"""
+CREATE TABLE IF NOT EXISTS access_logs (
+    id INTEGER PRIMARY KEY,
+    username TEXT,
+    ip TEXT,
+    user_agent TEXT,
+    action TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS whatsapp_queue (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER,
+    message TEXT NOT NULL,
+    template TEXT,
+    attachment TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    scheduled_at TEXT,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+"""
+
+SCHEMA_TRIGGERS = r"""
+-- Triggers para la tabla clients
+CREATE TRIGGER IF NOT EXISTS trg_clients_insert
+AFTER INSERT ON clients
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('clients','INSERT', COALESCE(NEW.id || '', 'system'), datetime('now'), NULL,
+           json_object('id', NEW.id, 'name', NEW.name, 'phone', NEW.phone,
+                      'monthly_amount', NEW.monthly_amount, 'signup_date', NEW.signup_date,
+                      'active', NEW.active));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clients_update
+AFTER UPDATE ON clients
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('clients','UPDATE', COALESCE(NEW.id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'name', OLD.name, 'phone', OLD.phone,
+                      'monthly_amount', OLD.monthly_amount, 'signup_date', OLD.signup_date,
+                      'active', OLD.active),
+           json_object('id', NEW.id, 'name', NEW.name, 'phone', NEW.phone,
+                      'monthly_amount', NEW.monthly_amount, 'signup_date', NEW.signup_date,
+                      'active', NEW.active));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clients_delete
+AFTER DELETE ON clients
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('clients','DELETE', COALESCE(OLD.id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'name', OLD.name, 'phone', OLD.phone,
+                      'monthly_amount', OLD.monthly_amount, 'signup_date', OLD.signup_date,
+                      'active', OLD.active), NULL);
+END;
+
+-- Triggers para la tabla payments
+CREATE TRIGGER IF NOT EXISTS trg_payments_insert
+AFTER INSERT ON payments
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('payments','INSERT', COALESCE(NEW.client_id || '', 'system'), datetime('now'), NULL,
+           json_object('id', NEW.id, 'client_id', NEW.client_id, 'year', NEW.year,
+                      'month', NEW.month, 'amount', NEW.amount, 'status', NEW.status,
+                      'paid_date', NEW.paid_date, 'payment_type', NEW.payment_type));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_update
+AFTER UPDATE ON payments
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('payments','UPDATE', COALESCE(NEW.client_id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'client_id', OLD.client_id, 'year', OLD.year,
+                      'month', OLD.month, 'amount', OLD.amount, 'status', OLD.status,
+                      'paid_date', OLD.paid_date, 'payment_type', OLD.payment_type),
+           json_object('id', NEW.id, 'client_id', NEW.client_id, 'year', NEW.year,
+                      'month', NEW.month, 'amount', NEW.amount, 'status', NEW.status,
+                      'paid_date', NEW.paid_date, 'payment_type', NEW.payment_type));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_delete
+AFTER DELETE ON payments
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('payments','DELETE', COALESCE(OLD.client_id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'client_id', OLD.client_id, 'year', OLD.year,
+                      'month', OLD.month, 'amount', OLD.amount, 'status', OLD.status,
+                      'paid_date', OLD.paid_date, 'payment_type', OLD.payment_type), NULL);
+END;
+
+-- Triggers para la tabla uploads
+CREATE TRIGGER IF NOT EXISTS trg_uploads_insert
+AFTER INSERT ON uploads
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('uploads','INSERT', COALESCE(NEW.client_id || '', 'system'), datetime('now'), NULL,
+           json_object('id', NEW.id, 'client_id', NEW.client_id, 'filename', NEW.filename,
+                      'stored_path', NEW.stored_path, 'uploaded_at', NEW.uploaded_at));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_uploads_delete
+AFTER DELETE ON uploads
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('uploads','DELETE', COALESCE(OLD.client_id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'client_id', OLD.client_id, 'filename', OLD.filename,
+                      'stored_path', OLD.stored_path, 'uploaded_at', OLD.uploaded_at), NULL);
+END;
+
+-- Protección del historial (inmutable)
+CREATE TRIGGER IF NOT EXISTS protect_historial_update
+BEFORE UPDATE ON historial_cambios
+BEGIN
+    SELECT RAISE(ABORT, 'historial_cambios is immutable');
+END;
+
+CREATE TRIGGER IF NOT EXISTS protect_historial_delete
+BEFORE DELETE ON historial_cambios
+BEGIN
+    SELECT RAISE(ABORT, 'historial_cambios is immutable');
+END;
+"""
+
+# Saldos por cliente: los triggers aplican la diferencia de cada fila de payments
+SCHEMA_CLIENT_BALANCES = r"""
+CREATE TABLE IF NOT EXISTS client_balances (
+    client_id INTEGER PRIMARY KEY,
+    pending_count INTEGER NOT NULL DEFAULT 0,
+    total_debt REAL NOT NULL DEFAULT 0,
+    paid_count INTEGER NOT NULL DEFAULT 0,
+    total_paid REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_client_balances_debt
+ON client_balances(total_debt DESC) WHERE pending_count > 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_balance_insert
+AFTER INSERT ON payments
+BEGIN
+    INSERT INTO client_balances(client_id, pending_count, total_debt, paid_count, total_paid)
+    VALUES (NEW.client_id,
+            CASE WHEN NEW.status='pending' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(client_id) DO UPDATE SET
+        pending_count = pending_count + excluded.pending_count,
+        total_debt = total_debt + excluded.total_debt,
+        paid_count = paid_count + excluded.paid_count,
+        total_paid = total_paid + excluded.total_paid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_balance_update
+AFTER UPDATE OF client_id, amount, status ON payments
+BEGIN
+    UPDATE client_balances SET
+        pending_count = pending_count - CASE WHEN OLD.status='pending' THEN 1 ELSE 0 END,
+        total_debt = total_debt - CASE WHEN OLD.status='pending' THEN OLD.amount ELSE 0 END,
+        paid_count = paid_count - CASE WHEN OLD.status='paid' THEN 1 ELSE 0 END,
+        total_paid = total_paid - CASE WHEN OLD.status='paid' THEN OLD.amount ELSE 0 END
+    WHERE client_id = OLD.client_id;
+
+    INSERT INTO client_balances(client_id, pending_count, total_debt, paid_count, total_paid)
+    VALUES (NEW.client_id,
+            CASE WHEN NEW.status='pending' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(client_id) DO UPDATE SET
+        pending_count = pending_count + excluded.pending_count,
+        total_debt = total_debt + excluded.total_debt,
+        paid_count = paid_count + excluded.paid_count,
+        total_paid = total_paid + excluded.total_paid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_balance_delete
+AFTER DELETE ON payments
+BEGIN
+    UPDATE client_balances SET
+        pending_count = pending_count - CASE WHEN OLD.status='pending' THEN 1 ELSE 0 END,
+        total_debt = total_debt - CASE WHEN OLD.status='pending' THEN OLD.amount ELSE 0 END,
+        paid_count = paid_count - CASE WHEN OLD.status='paid' THEN 1 ELSE 0 END,
+        total_paid = total_paid - CASE WHEN OLD.status='paid' THEN OLD.amount ELSE 0 END
+    WHERE client_id = OLD.client_id;
+END;
+"""
+
+# Índice FTS5 de clientes (rowid = clients.id): nombre y teléfono sólo con dígitos
+_PHONE_DIGITS = "replace(replace(replace(replace(replace(replace(COALESCE({0}.phone, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+
+SCHEMA_CLIENTS_FTS = r"""
+CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(name, phone, tokenize='trigram');
+
+CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
+
+CREATE TRIGGER IF NOT EXISTS trg_clients_fts_insert
+AFTER INSERT ON clients
+BEGIN
+    INSERT INTO clients_fts(rowid, name, phone) VALUES (NEW.id, NEW.name, """ + _PHONE_DIGITS.format('NEW') + r""");
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update
+AFTER UPDATE OF name, phone ON clients
+BEGIN
+    DELETE FROM clients_fts WHERE rowid = OLD.id;
+    INSERT INTO clients_fts(rowid, name, phone) VALUES (NEW.id, NEW.name, """ + _PHONE_DIGITS.format('NEW') + r""");
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_clients_fts_delete
+AFTER DELETE ON clients
+BEGIN
+    DELETE FROM clients_fts WHERE rowid = OLD.id;
+END;
+
+DELETE FROM clients_fts;
+INSERT INTO clients_fts(rowid, name, phone)
+SELECT id, name, """ + _PHONE_DIGITS.format('clients') + r""" FROM clients;
+"""
+
+SCHEMA_DATA_VERSION = r"""
+-- Contador de cambios para validadores HTTP (ETag). clients, payments y uploads ya
+-- quedan registrados en historial_cambios; aquí sólo se cuentan las tablas sin auditoría.
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    changed_at TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO data_version(id, version, changed_at) VALUES (1, 0, datetime('now'));
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_config_version_insert
+AFTER INSERT ON payment_plan_config
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_config_version_update
+AFTER UPDATE ON payment_plan_config
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_config_version_delete
+AFTER DELETE ON payment_plan_config
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_payments_version_insert
+AFTER INSERT ON payment_plan_payments
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_payments_version_update
+AFTER UPDATE ON payment_plan_payments
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payment_plan_payments_version_delete
+AFTER DELETE ON payment_plan_payments
+BEGIN
+    UPDATE data_version SET version = version + 1, changed_at = datetime('now') WHERE id = 1;
+END;
+"""
+
+
+SCHEMA_REVENUE_ROLLUP = r"""
+-- Totales por mes mantenidos por triggers (source: 'payments' o 'plans')
+CREATE TABLE IF NOT EXISTS revenue_rollup (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    paid_count INTEGER NOT NULL DEFAULT 0,
+    paid_amount REAL NOT NULL DEFAULT 0,
+    pending_count INTEGER NOT NULL DEFAULT 0,
+    pending_amount REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, month, source)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_insert
+AFTER INSERT ON payments
+BEGIN
+    INSERT INTO revenue_rollup(year, month, source, paid_count, paid_amount, pending_count, pending_amount)
+    VALUES (NEW.year, NEW.month, 'payments',
+            CASE WHEN NEW.status='paid' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(year, month, source) DO UPDATE SET
+        paid_count = paid_count + excluded.paid_count,
+        paid_amount = paid_amount + excluded.paid_amount,
+        pending_count = pending_count + excluded.pending_count,
+        pending_amount = pending_amount + excluded.pending_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_update
+AFTER UPDATE OF year, month, amount, status ON payments
+BEGIN
+    UPDATE revenue_rollup SET
+        paid_count = paid_count - CASE WHEN OLD.status='paid' THEN 1 ELSE 0 END,
+        paid_amount = paid_amount - CASE WHEN OLD.status='paid' THEN OLD.amount ELSE 0 END,
+        pending_count = pending_count - CASE WHEN OLD.status='pending' THEN 1 ELSE 0 END,
+        pending_amount = pending_amount - CASE WHEN OLD.status='pending' THEN OLD.amount ELSE 0 END
+    WHERE year = OLD.year AND month = OLD.month AND source = 'payments';
+
+    INSERT INTO revenue_rollup(year, month, source, paid_count, paid_amount, pending_count, pending_amount)
+    VALUES (NEW.year, NEW.month, 'payments',
+            CASE WHEN NEW.status='paid' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='paid' THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN 1 ELSE 0 END,
+            CASE WHEN NEW.status='pending' THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(year, month, source) DO UPDATE SET
+        paid_count = paid_count + excluded.paid_count,
+        paid_amount = paid_amount + excluded.paid_amount,
+        pending_count = pending_count + excluded.pending_count,
+        pending_amount = pending_amount + excluded.pending_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_delete
+AFTER DELETE ON payments
+BEGIN
+    UPDATE revenue_rollup SET
+        paid_count = paid_count - CASE WHEN OLD.status='paid' THEN 1 ELSE 0 END,
+        paid_amount = paid_amount - CASE WHEN OLD.status='paid' THEN OLD.amount ELSE 0 END,
+        pending_count = pending_count - CASE WHEN OLD.status='pending' THEN 1 ELSE 0 END,
+        pending_amount = pending_amount - CASE WHEN OLD.status='pending' THEN OLD.amount ELSE 0 END
+    WHERE year = OLD.year AND month = OLD.month AND source = 'payments';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_plan_payments_rollup_insert
+AFTER INSERT ON payment_plan_payments
+BEGIN
+    INSERT INTO revenue_rollup(year, month, source, paid_count, paid_amount, pending_count, pending_amount)
+    VALUES (NEW.year, NEW.month, 'plans',
+            CASE WHEN NEW.paid=1 THEN 1 ELSE 0 END,
+            CASE WHEN NEW.paid=1 THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.paid=0 THEN 1 ELSE 0 END,
+            CASE WHEN NEW.paid=0 THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(year, month, source) DO UPDATE SET
+        paid_count = paid_count + excluded.paid_count,
+        paid_amount = paid_amount + excluded.paid_amount,
+        pending_count = pending_count + excluded.pending_count,
+        pending_amount = pending_amount + excluded.pending_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_plan_payments_rollup_update
+AFTER UPDATE OF year, month, amount, paid ON payment_plan_payments
+BEGIN
+    UPDATE revenue_rollup SET
+        paid_count = paid_count - CASE WHEN OLD.paid=1 THEN 1 ELSE 0 END,
+        paid_amount = paid_amount - CASE WHEN OLD.paid=1 THEN OLD.amount ELSE 0 END,
+        pending_count = pending_count - CASE WHEN OLD.paid=0 THEN 1 ELSE 0 END,
+        pending_amount = pending_amount - CASE WHEN OLD.paid=0 THEN OLD.amount ELSE 0 END
+    WHERE year = OLD.year AND month = OLD.month AND source = 'plans';
+
+    INSERT INTO revenue_rollup(year, month, source, paid_count, paid_amount, pending_count, pending_amount)
+    VALUES (NEW.year, NEW.month, 'plans',
+            CASE WHEN NEW.paid=1 THEN 1 ELSE 0 END,
+            CASE WHEN NEW.paid=1 THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.paid=0 THEN 1 ELSE 0 END,
+            CASE WHEN NEW.paid=0 THEN NEW.amount ELSE 0 END)
+    ON CONFLICT(year, month, source) DO UPDATE SET
+        paid_count = paid_count + excluded.paid_count,
+        paid_amount = paid_amount + excluded.paid_amount,
+        pending_count = pending_count + excluded.pending_count,
+        pending_amount = pending_amount + excluded.pending_amount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_plan_payments_rollup_delete
+AFTER DELETE ON payment_plan_payments
+BEGIN
+    UPDATE revenue_rollup SET
+        paid_count = paid_count - CASE WHEN OLD.paid=1 THEN 1 ELSE 0 END,
+        paid_amount = paid_amount - CASE WHEN OLD.paid=1 THEN OLD.amount ELSE 0 END,
+        pending_count = pending_count - CASE WHEN OLD.paid=0 THEN 1 ELSE 0 END,
+        pending_amount = pending_amount - CASE WHEN OLD.paid=0 THEN OLD.amount ELSE 0 END
+    WHERE year = OLD.year AND month = OLD.month AND source = 'plans';
+END;
+"""
+
+SCHEMA_CLIENTS_AUDIT_COLUMNS = r"""
+-- Auditar sólo los UPDATE que tocan columnas registradas: escribir phone_e164
+-- (columna derivada, fuera del historial) ya no genera eventos
+DROP TRIGGER IF EXISTS trg_clients_update;
+
+CREATE TRIGGER trg_clients_update
+AFTER UPDATE OF name, phone, monthly_amount, signup_date, active ON clients
+BEGIN
+    INSERT INTO historial_cambios(tabla, operacion, usuario, fecha_hora, old_values, new_values)
+    VALUES('clients','UPDATE', COALESCE(NEW.id || '', 'system'), datetime('now'),
+           json_object('id', OLD.id, 'name', OLD.name, 'phone', OLD.phone,
+                      'monthly_amount', OLD.monthly_amount, 'signup_date', OLD.signup_date,
+                      'active', OLD.active),
+           json_object('id', NEW.id, 'name', NEW.name, 'phone', NEW.phone,
+                      'monthly_amount', NEW.monthly_amount, 'signup_date', NEW.signup_date,
+                      'active', NEW.active));
+END;
+"""
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _create_default_admin(conn):
+    """Crea el usuario admin por defecto si no hay administradores"""
+    if conn.execute("SELECT COUNT(*) FROM admins").fetchone()[0] == 0:
+        conn.execute("INSERT INTO admins(username, password, created_at) VALUES (?, ?, datetime('now'))",
+                     ('admin', generate_password_hash('admin')))
+        print("✅ Usuario admin creado (usuario: admin, contraseña: admin)")
+
+
+def _payments_extra_columns(conn):
+    """Agrega custom_amount, paid_date y payment_type a bases antiguas"""
+    columns = _columns(conn, 'payments')
+    if 'paid_date' not in columns:
+        conn.execute('ALTER TABLE payments ADD COLUMN paid_date TEXT')
+    if 'payment_type' not in columns:
+        conn.execute('ALTER TABLE payments ADD COLUMN payment_type TEXT')
+    if 'custom_amount' not in columns:
+        conn.execute('ALTER TABLE payments ADD COLUMN custom_amount REAL')
+    # Se ejecuta una sola vez: copiar amount a custom_amount
+    conn.execute('UPDATE payments SET custom_amount = amount WHERE custom_amount IS NULL')
+
+
+# (versión, descripción, pasos). Un paso es un script SQL o una función
+# que recibe la conexión. Nunca modificar una migración ya publicada:
+# agregar una nueva al final.
+MIGRATIONS = [
+    (1, 'Esquema inicial', [SCHEMA_TABLES, SCHEMA_PAYMENT_PLANS, SCHEMA_SYSTEM,
+                            SCHEMA_TRIGGERS, _create_default_admin]),
+    (2, 'Columnas custom_amount, paid_date y payment_type en payments', [_payments_extra_columns]),
+    (3, 'Índices por estado en payments', [r"""
+        CREATE INDEX IF NOT EXISTS idx_payments_status
+        ON payments(status);
+
+        CREATE INDEX IF NOT EXISTS idx_payments_client_status
+        ON payments(client_id, status);
+    """]),
+    (4, 'Índice de cobertura para el resumen mensual de planes', [r"""
+        CREATE INDEX IF NOT EXISTS idx_plan_payments_month
+        ON payment_plan_payments(year, month, paid, client_id, amount);
+    """]),
+    (5, 'Tabla client_balances mantenida por triggers', [SCHEMA_CLIENT_BALANCES, rebuild_client_balances]),
+    (6, 'Índice de cobertura para morosos', [r"""
+        CREATE INDEX IF NOT EXISTS idx_payments_status_client
+        ON payments(status, client_id, year, month, amount);
+    """]),
+    (7, 'Cola de revisión de conciliación bancaria', [r"""
+        CREATE TABLE IF NOT EXISTS reconciliation_queue (
+            id INTEGER PRIMARY KEY,
+            batch TEXT NOT NULL,
+            line_number INTEGER NOT NULL,
+            line_date TEXT,
+            amount REAL,
+            phone TEXT,
+            name TEXT,
+            description TEXT,
+            raw TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            payment_id INTEGER,
+            plan_payment_id INTEGER,
+            created_at TEXT NOT NULL,
+            resolved_at TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_reconciliation_queue_status
+        ON reconciliation_queue(status, id);
+    """]),
+    (8, 'Búsqueda de clientes con FTS5 (trigram)', [SCHEMA_CLIENTS_FTS]),
+    (9, 'Teléfono normalizado (E.164) e indexado en clients', [r"""
+        ALTER TABLE clients ADD COLUMN phone_e164 TEXT;
+
+        CREATE INDEX IF NOT EXISTS idx_clients_phone_e164
+        ON clients(phone_e164) WHERE phone_e164 IS NOT NULL;
+    """, backfill_phone_e164]),
+    (10, 'Contador data_version para ETag', [SCHEMA_DATA_VERSION]),
+    (11, 'Tabla revenue_rollup mantenida por triggers', [SCHEMA_REVENUE_ROLLUP, rebuild_revenue_rollup]),
+    (12, 'Auditoría de clients sin las escrituras de phone_e164', [SCHEMA_CLIENTS_AUDIT_COLUMNS]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _statements(script):
+    """Divide un script en sentencias completas (respetando BEGIN ... END de triggers)"""
+    buf = ''
+    for part in script.split(';'):
+        buf += part + ';'
+        if sqlite3.complete_statement(buf):
+            if buf.strip(' \t\r\n;'):
+                yield buf.strip()
+            buf = ''
+
+
+def current_version(conn):
+    """Versión del esquema registrada en la base"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def pending_migrations(conn):
+    """Migraciones aún no aplicadas, en orden"""
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def _apply(conn, steps):
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            for statement in _statements(step):
+                conn.execute(statement)
+
+
+def migrate(path=None, pragmas=None):
+    """Aplica las migraciones pendientes y devuelve las versiones aplicadas.
+
+    Si el esquema ya está al día sólo cuesta leer ``PRAGMA user_version``.
+    """
+    conn = connect(path, pragmas)
+    try:
+        if current_version(conn) >= LATEST_VERSION:
+            return []
+        with _lock:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Releer bajo el lock: otro proceso pudo haber migrado ya
+                applied = []
+                for version, description, steps in pending_migrations(conn):
+                    print(f"🔄 Ejecutando migración {version}: {description}")
+                    _apply(conn, steps)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                    applied.append(version)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if applied:
+            print(f"✅ Migraciones completadas: {len(applied)} (versión {applied[-1]})")
+        return applied
+    finally:
+        conn.close()
+
+
+def status(path=None):
+    """Devuelve (versión actual, lista de migraciones pendientes)"""
+    conn = connect(path)
+    try:
+        return current_version(conn), pending_migrations(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migraciones de la base de datos de Sistema Pagos')
+    parser.add_argument('command', choices=['status', 'upgrade'], nargs='?', default='status')
+    parser.add_argument('--db', default=DATABASE, help='Ruta de la base SQLite')
+    args = parser.parse_args(argv)
+
+    if args.command == 'upgrade':
+        applied = migrate(args.db)
+        if not applied:
+            print("ℹ️  No hay migraciones pendientes")
+        return 0
+
+    version, pending = status(args.db)
+    print(f"📊 Versión actual: {version} (última: {LATEST_VERSION})")
+    for number, description, _ in pending:
+        print(f"   - pendiente {number}: {description}")
+    if not pending:
+        print("✅ Esquema al día")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
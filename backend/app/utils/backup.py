@@ -1,9 +1,16 @@
-import os, shutil, glob, time
+import os, sqlite3, glob, time
 def perform_backup(db_path='sistemapagos.db', backups_dir='backups', keep=7):
     os.makedirs(backups_dir, exist_ok=True)
     ts = time.strftime('%Y%m%d_%H%M%S')
     dst = os.path.join(backups_dir, f'sistemapagos_{ts}.db')
-    shutil.copy2(db_path, dst)
+    # API de backup de SQLite: copia consistente aunque haya datos en el WAL
+    src = sqlite3.connect(db_path)
+    out = sqlite3.connect(dst)
+    try:
+        src.backup(out)
+    finally:
+        out.close()
+        src.close()
     # rotate older backups keep last `keep`
     files = sorted(glob.glob(os.path.join(backups_dir, 'sistemapagos_*.db')), reverse=True)
     for f in files[keep:]:
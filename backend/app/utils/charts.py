@@ -0,0 +1,82 @@
+"""
+Gráficos de reportes renderizados en memoria con la API orientada a objetos de
+matplotlib (Figure + canvas Agg, sin el estado global de pyplot), con un caché
+LRU de PNG por (tipo de gráfico, cliente, versión de datos).
+"""
+from collections import OrderedDict
+import io
+import threading
+
+DEFAULT_CACHE_SIZE = 128
+
+class ChartCache:
+    """LRU de PNG compartido por los hilos del proceso"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+cache = ChartCache()
+
+def _png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+def client_summary_png(labels, paid, pending):
+    """Barras apiladas pagado/pendiente por mes"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 3))
+    ax = fig.add_subplot()
+    x = range(len(labels))
+    ax.bar(x, paid, label='pagado')
+    ax.bar(x, pending, bottom=paid, label='pendiente')
+    ax.set_xticks(list(x))
+    ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=8)
+    ax.legend()
+    fig.tight_layout()
+    return _png(fig)
+
+def global_summary_png(years, paid, pending):
+    """Líneas de monto pagado y pendiente por año"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(6, 3))
+    ax = fig.add_subplot()
+    x = range(len(years))
+    ax.plot(x, paid, marker='o', label='pagado')
+    ax.plot(x, pending, marker='o', label='pendiente')
+    ax.set_xticks(list(x))
+    ax.set_xticklabels([str(y) for y in years])
+    ax.legend()
+    fig.tight_layout()
+    return _png(fig)
+
+def cached_chart(key, render):
+    """PNG de `key`; `render()` sólo se llama si no está en el caché"""
+    png = cache.get(key)
+    if png is None:
+        png = render()
+        cache.put(key, png)
+    return png
@@ -1,9 +1,65 @@
-from openpyxl import Workbook
-def payments_to_xlsx(rows, out_path):
-    wb = Workbook()
-    ws = wb.active
-    ws.append(['id','client_id','year','month','amount','status','paid_date','payment_type'])
-    for r in rows:
-        ws.append([r['id'], r['client_id'], r['year'], r['month'], r['amount'], r['status'], r['paid_date'], r['payment_type']])
-    wb.save(out_path)
-    return out_path
+import io
+import re
+import tempfile
+from itertools import groupby
+
+PAYMENT_COLUMNS = ['id','client_id','year','month','amount','status','paid_date','payment_type']
+# Por encima de este tamaño el archivo temporal pasa de memoria a disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def _sheet_title(value):
+    """Título válido para una hoja (máx. 31 caracteres, sin []:*?/\\)"""
+    return re.sub(r'[\[\]:*?/\\]', ' ', str(value))[:31] or 'Hoja'
+
+def payments_to_xlsx(rows, out=None, group_by=None, columns=PAYMENT_COLUMNS, title=None):
+    """
+    Escribe pagos en un XLSX con openpyxl en modo write-only (sin mantener celdas en memoria).
+
+    rows: iterable de filas (dict o sqlite3.Row), por ejemplo un cursor.
+    out: ruta o archivo destino; si es None se usa un SpooledTemporaryFile.
+    group_by: función fila -> título de hoja para crear una hoja por grupo
+        (por ejemplo por año o por cliente). Las filas deben venir ordenadas por ese grupo.
+
+    Retorna `out` (rebobinado al inicio si es un archivo).
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    if group_by is None:
+        groups = [(title or 'Pagos', rows)]
+    else:
+        groups = groupby(rows, key=group_by)
+    empty = True
+    for name, group in groups:
+        ws = wb.create_sheet(_sheet_title(name))
+        ws.append(columns)
+        for r in group:
+            ws.append([r[col] for col in columns])
+        empty = False
+    if empty:
+        wb.create_sheet(_sheet_title(title or 'Pagos')).append(columns)
+    if out is None:
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    wb.save(out)
+    if hasattr(out, 'seek'):
+        out.seek(0)
+    return out
+
+def payments_query_xlsx(db_path, sql, params=(), group_columns=None, title=None, pragmas=None):
+    """
+    Ejecuta `sql` en su propia conexión y retorna los bytes del XLSX. Pensada para el
+    pool de renderizado: sólo recibe datos serializables y lee las filas en el proceso
+    que escribe el libro, sin pasarlas entre procesos.
+
+    group_columns: columnas cuyos valores (unidos con espacios) forman el nombre de la
+        hoja, p. ej. ('year',) o ('client_id', 'client_name').
+    """
+    from ..db import connect
+    group_by = None
+    if group_columns:
+        group_by = lambda r: ' '.join(str(r[c]) for c in group_columns)
+    conn = connect(db_path, pragmas)
+    try:
+        out = payments_to_xlsx(conn.execute(sql, params), out=io.BytesIO(), group_by=group_by, title=title)
+    finally:
+        conn.close()
+    return out.getvalue()
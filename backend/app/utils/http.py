@@ -0,0 +1,58 @@
+from flask import request, current_app, make_response
+from functools import wraps
+from datetime import datetime, timezone
+import hashlib
+from ..db import get_db, change_token
+
+def _validators():
+    """ETag y Last-Modified de la respuesta actual.
+
+    Además del change_token, el ETag incluye la ruta con sus parámetros y la fecha
+    del día: varias vistas usan por defecto el año o mes en curso, así que la misma
+    URL cambia de contenido al cambiar de período aunque los datos no cambien.
+    """
+    token, modified = change_token(get_db())
+    now = datetime.now().astimezone()
+    variant = hashlib.sha1(f'{request.full_path}|{now.date().isoformat()}'.encode()).hexdigest()[:12]
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+    modified = max(modified, midnight) if modified else midnight
+    return f'{token}-{variant}', modified
+
+def conditional(view):
+    """
+    GET condicional con ETag/Last-Modified derivados de change_token(), la URL y la fecha.
+    Si el cliente ya tiene la versión actual responde 304 sin ejecutar la vista.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag, modified = _validators()
+        # If-None-Match tiene prioridad; la fecha sólo se usa si el cliente no envía ETag
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            fresh = bool(since and modified <= since)
+        if fresh:
+            response = current_app.response_class(status=304)
+            # Mismos Vary que la respuesta completa (las vistas JSON se comprimen)
+            response.vary.add('Accept-Encoding')
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Last-Modified tiene resolución de segundos: si el último cambio es de este
+        # mismo segundo, otro cambio en ese segundo quedaría oculto; sólo se envía el ETag
+        if modified < datetime.now(timezone.utc).replace(microsecond=0):
+            response.last_modified = modified
+        # Por defecto siempre revalidar: el 304 es barato y los datos pueden cambiar en cualquier momento
+        if 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+def busy_response(retry_after=5):
+    """503 para trabajos de renderizado que superaron su tiempo límite"""
+    response = make_response('Servidor ocupado generando otros reportes, intente de nuevo en unos segundos', 503)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
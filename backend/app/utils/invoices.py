@@ -0,0 +1,114 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeout, as_completed
+from .pdf import invoice_pdf_bytes
+from . import render_pool
+
+# Campos que determinan el contenido de la factura
+CLIENT_FIELDS = ('id', 'name')
+PAYMENT_FIELDS = ('id', 'year', 'month', 'amount', 'status')
+
+def invoice_cache_key(client, payments):
+    """Hash del contenido de la factura: cambia sólo si cambian el cliente o sus pagos"""
+    data = {
+        'client': [client.get(f) for f in CLIENT_FIELDS],
+        'payments': [[p[f] for f in PAYMENT_FIELDS] for p in payments],
+    }
+    raw = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def invoice_cache_path(folder, client, payments):
+    return os.path.join(folder, f"invoice_{client['id']}_{invoice_cache_key(client, payments)}.pdf")
+
+def store_invoice(path, data):
+    """Guarda el PDF de forma atómica y elimina versiones anteriores del mismo cliente"""
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    prefix = os.path.basename(path).rsplit('_', 1)[0]
+    for old in glob.glob(os.path.join(folder, prefix + '_*.pdf')):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+def cached_invoice(folder, client, payments):
+    """Ruta de la factura en caché, generándola sólo si el contenido cambió"""
+    path = invoice_cache_path(folder, client, payments)
+    if not os.path.exists(path):
+        store_invoice(path, render_pool.run(invoice_pdf_bytes, client, payments))
+    return path
+
+class _ZipSink(io.RawIOBase):
+    """Destino no posicionable para zipfile: acumula bytes hasta que se leen"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def invoices_zip_stream(folder, jobs, timeout=None):
+    """
+    Genera un ZIP con las facturas de `jobs` [(client, payments), ...] como flujo de bytes.
+
+    Las facturas en caché se agregan directamente; las demás se renderizan en
+    paralelo en el pool de renderizado (o en el proceso actual si no está iniciado)
+    y se guardan en caché a medida que terminan. Con el pool, si el lote no termina
+    dentro de `timeout` segundos se cancela lo pendiente y se lanza RenderTimeout.
+    """
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    pending = []
+    for client, payments in jobs:
+        path = invoice_cache_path(folder, client, payments)
+        name = f"invoice_{client['id']}.pdf"
+        if os.path.exists(path):
+            zf.write(path, name)
+            yield sink.drain()
+        else:
+            pending.append((path, name, client, payments))
+
+    pool = render_pool.executor()
+    if pending and pool is None:
+        for path, name, client, payments in pending:
+            data = invoice_pdf_bytes(client, payments)
+            store_invoice(path, data)
+            zf.writestr(name, data)
+            yield sink.drain()
+    elif pending:
+        futures = {pool.submit(invoice_pdf_bytes, client, payments): (path, name)
+                   for path, name, client, payments in pending}
+        try:
+            for future in as_completed(futures, timeout=timeout or render_pool.DEFAULT_TIMEOUT):
+                path, name = futures[future]
+                data = future.result()
+                store_invoice(path, data)
+                zf.writestr(name, data)
+                yield sink.drain()
+        except FutureTimeout:
+            for future in futures:
+                future.cancel()
+            raise render_pool.RenderTimeout(f"invoices.zip superó {timeout or render_pool.DEFAULT_TIMEOUT}s")
+
+    zf.close()
+    yield sink.drain()
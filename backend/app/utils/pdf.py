@@ -1,6 +1,8 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+import io
 def invoice_pdf(client, payments, out_path):
+    # reportlab se importa al generar la primera factura, no al arrancar la app
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
     c = canvas.Canvas(out_path, pagesize=A4)
     w, h = A4
     c.setFont('Helvetica-Bold', 14)
@@ -23,3 +25,9 @@ def invoice_pdf(client, payments, out_path):
             y = h-80
     c.save()
     return out_path
+
+def invoice_pdf_bytes(client, payments):
+    """Genera la factura en memoria y retorna los bytes del PDF"""
+    buf = io.BytesIO()
+    invoice_pdf(client, payments, buf)
+    return buf.getvalue()
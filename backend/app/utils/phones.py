@@ -0,0 +1,30 @@
+from whatsapp_sender.utils import validate_phone
+
+DEFAULT_COUNTRY_CODE = '51'
+
+def to_e164(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """'999 888 777' -> '+51999888777' (None si el número no es válido)"""
+    if not phone:
+        return None
+    ok, normalized, _ = validate_phone(str(phone), country_code)
+    return '+' + normalized if ok else None
+
+def find_clients_by_phone(db, phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Clientes con ese teléfono (búsqueda por índice sobre clients.phone_e164)"""
+    e164 = to_e164(phone, country_code)
+    if e164 is None:
+        return []
+    return db.execute('SELECT * FROM clients WHERE phone_e164=? ORDER BY id', (e164,)).fetchall()
+
+def backfill_phone_e164(conn, country_code=DEFAULT_COUNTRY_CODE):
+    """Calcula phone_e164 para los clientes que no lo tienen (no hace commit)"""
+    cache = {}
+    updates = []
+    for client_id, phone in conn.execute(
+            "SELECT id, phone FROM clients WHERE phone_e164 IS NULL AND phone IS NOT NULL AND phone != ''"):
+        if phone not in cache:
+            cache[phone] = to_e164(phone, country_code)
+        if cache[phone]:
+            updates.append((cache[phone], client_id))
+    conn.executemany('UPDATE clients SET phone_e164=? WHERE id=?', updates)
+    return len(updates)
@@ -0,0 +1,102 @@
+"""
+Pool de procesos pre-calentado para el renderizado pesado (gráficos matplotlib,
+PDF con reportlab, XLSX con openpyxl), fuera del hilo del request y del GIL.
+
+Los procesos importan las librerías una sola vez al arrancar. Si el pool no está
+iniciado (tests, RENDER_WORKERS=0) o se rompe, el trabajo se hace en el proceso actual.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+
+_pool = None
+_timeout = DEFAULT_TIMEOUT
+_lock = threading.Lock()
+
+class RenderTimeout(Exception):
+    """El trabajo no terminó dentro del tiempo límite"""
+
+def _warm():
+    """Inicializador de cada proceso: importar una vez las librerías de renderizado"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.figure  # noqa: F401
+    import reportlab.pdfgen.canvas  # noqa: F401
+    import openpyxl  # noqa: F401
+
+def _ping():
+    return os.getpid()
+
+def start(workers, timeout=DEFAULT_TIMEOUT):
+    """Crea el pool y lanza sus procesos de inmediato (no espera a que terminen de importar)"""
+    global _pool, _timeout
+    if not workers or multiprocessing.parent_process() is not None:
+        # Los procesos del pool vuelven a importar la app: no deben crear su propio pool
+        return None
+    with _lock:
+        _timeout = timeout
+        if _pool is None:
+            ctx = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_warm)
+            # ProcessPoolExecutor crea los procesos al recibir trabajos
+            for _ in range(workers):
+                _pool.submit(_ping)
+            logger.info("Pool de renderizado iniciado con %d procesos", workers)
+        return _pool
+
+def shutdown():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+atexit.register(shutdown)
+
+def executor():
+    """El pool en uso, o None si no está iniciado"""
+    return _pool
+
+def _discard(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def run(fn, *args, timeout=None):
+    """
+    Ejecuta fn(*args) en el pool y retorna el resultado. fn y sus argumentos deben
+    poder serializarse (funciones de módulo, listas/tuplas/dicts).
+
+    Lanza RenderTimeout si no termina a tiempo (el proceso sigue con ese trabajo).
+    Sin pool, o con el pool roto, se ejecuta en el proceso actual.
+    """
+    pool = _pool
+    if pool is None:
+        return fn(*args)
+    try:
+        future = pool.submit(fn, *args)
+    except RuntimeError as e:
+        # Pool roto (BrokenProcessPool) o ya cerrado durante el apagado
+        return _fallback(pool, e, fn, args)
+    try:
+        return future.result(timeout=timeout or _timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise RenderTimeout(f"{fn.__name__} superó {timeout or _timeout}s")
+    except BrokenProcessPool as e:
+        return _fallback(pool, e, fn, args)
+
+def _fallback(pool, error, fn, args):
+    logger.warning("Pool de renderizado no disponible (%s); se renderiza en el proceso actual", error)
+    _discard(pool)
+    return fn(*args)
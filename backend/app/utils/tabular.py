@@ -0,0 +1,109 @@
+import csv
+import io
+import re
+import unicodedata
+from datetime import datetime, date
+
+def normalize_header(value):
+    """'Teléfono ' -> 'telefono'"""
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', text.strip().lower()).strip('_')
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    header = next(reader, None)
+    if header is None:
+        return
+    keys = [normalize_header(h) for h in header]
+    for values in reader:
+        if any(v.strip() for v in values):
+            yield dict(zip(keys, values))
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keys = [normalize_header(h) for h in header]
+        for values in rows:
+            if any(v not in (None, '') for v in values):
+                yield dict(zip(keys, values))
+    finally:
+        wb.close()
+
+def read_rows(stream, filename):
+    """
+    Itera las filas de un archivo CSV o XLSX como dicts con encabezados normalizados.
+    Las filas se leen de a una; el archivo nunca se carga completo en memoria.
+    """
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        return _xlsx_rows(stream)
+    return _csv_rows(stream)
+
+def pick(row, *names):
+    """Primer valor no vacío entre varias columnas posibles"""
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value.strip() if isinstance(value, str) else value
+    return None
+
+def parse_amount(value):
+    """
+    Convierte '1.234,56', '1,234.56', '1.500', 'S/ 50' o 50 a float (None si no es válido).
+
+    Con un solo tipo de separador, 1 o 2 dígitos finales son decimales y grupos de 3
+    son miles ('1.500' -> 1500, '1,500' -> 1500). Los casos que no encajan ('0.500',
+    '1.5000', '1.50.0') se rechazan en lugar de adivinar.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r'[^\d,.\-]', '', str(value))
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text or '.' in text:
+        sep = ',' if ',' in text else '.'
+        whole, _, decimals = text.rpartition(sep)
+        if text.count(sep) == 1 and len(decimals) in (1, 2):
+            text = f"{whole}.{decimals}"
+        elif re.fullmatch(r'-?[1-9]\d{0,2}(' + re.escape(sep) + r'\d{3})+', text):
+            text = text.replace(sep, '')
+        else:
+            return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S')
+
+def parse_date(value):
+    """Fecha en formato YYYY-MM-DD (None si no se reconoce)"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, date):
+        return value.isoformat()
+    if not value:
+        return None
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
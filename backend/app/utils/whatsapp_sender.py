@@ -1,7 +1,9 @@
 import os
-import requests
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # Configuración de WhatsApp Business API
 WHATSAPP_API_URL = "https://graph.facebook.com/v18.0"
 WHATSAPP_PHONE_ID = os.getenv('WHATSAPP_PHONE_ID', 'TU_PHONE_NUMBER_ID')
@@ -21,11 +23,13 @@ def send_whatsapp_message_now(phone_number, message):
     
     # Validar configuración
     if WHATSAPP_PHONE_ID == 'TU_PHONE_NUMBER_ID' or WHATSAPP_ACCESS_TOKEN == 'TU_ACCESS_TOKEN':
-        print("⚠️ WhatsApp no configurado. Usando modo DEMO.")
-        print("📋 Configura WHATSAPP_PHONE_ID y WHATSAPP_ACCESS_TOKEN en .env")
+        logger.debug("WhatsApp no configurado (WHATSAPP_PHONE_ID / WHATSAPP_ACCESS_TOKEN). Usando modo DEMO.")
         # Retornar éxito en modo demo para testing
         return True, "demo-message-id"
     
+    # requests sólo se carga si hay envíos reales (no en modo DEMO ni al arrancar la app)
+    import requests
+
     # Limpiar número de teléfono
     clean_phone = phone_number.replace('+', '').replace(' ', '').replace('-', '')
     
@@ -58,24 +62,24 @@ def send_whatsapp_message_now(phone_number, message):
         if response.status_code == 200:
             data = response.json()
             message_id = data.get('messages', [{}])[0].get('id', 'unknown')
-            print(f"✅ Mensaje enviado a {phone_number}: {message_id}")
+            logger.info("Mensaje enviado a %s: %s", phone_number, message_id)
             return True, message_id
         else:
             error_msg = response.json().get('error', {}).get('message', 'Error desconocido')
-            print(f"❌ Error enviando a {phone_number}: {error_msg}")
+            logger.error("Error enviando a %s: %s", phone_number, error_msg)
             return False, error_msg
             
     except requests.exceptions.Timeout:
         error_msg = "Timeout: La API de WhatsApp no respondió a tiempo"
-        print(f"❌ {error_msg}")
+        logger.error(error_msg)
         return False, error_msg
         
     except requests.exceptions.RequestException as e:
         error_msg = f"Error de conexión: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error(error_msg)
         return False, error_msg
         
     except Exception as e:
         error_msg = f"Error inesperado: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error(error_msg)
         return False, error_msg
@@ -5,9 +5,11 @@ import os
 # Cargar variables de entorno
 load_dotenv()
 
-app = create_app()
-
 if __name__ == '__main__':
+    # Sólo en el proceso principal: los procesos del pool de renderizado (spawn)
+    # vuelven a importar este módulo y no deben crear otra app ni otro pool
+    app = create_app()
+
     print("🚀 Iniciando servidor...")
     print("📱 WhatsApp configurado para envío INMEDIATO")
     
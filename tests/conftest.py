@@ -0,0 +1,34 @@
+import pytest
+from backend.app import create_app
+from backend.app.db import get_db
+
+
+@pytest.fixture(autouse=True)
+def _no_render_pool(monkeypatch):
+    # Sin pool de renderizado en los tests (también en los create_app() sin TESTING):
+    # todo se renderiza en el proceso de pytest
+    monkeypatch.setenv('RENDER_WORKERS', '0')
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'DATABASE': str(tmp_path / 'test.db'),
+        'REPORT_FOLDER': str(tmp_path / 'reports'),
+        'TESTING': True,
+    })
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin'] = 'admin'
+    return client
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        yield get_db()
@@ -0,0 +1,124 @@
+import gzip
+import json
+import zlib
+from datetime import timedelta
+
+
+def _seed(db, n=30):
+    db.executemany("INSERT INTO clients(name, phone, monthly_amount, signup_date) VALUES (?, ?, 10, '2026-01-01')",
+                   [(f'Cliente {i:03d}', f'9990000{i:02d}') for i in range(n)])
+    db.commit()
+
+
+def test_clients_keyset_pages(client, db):
+    _seed(db)
+    seen = []
+    after_id = 0
+    while after_id is not None:
+        r = client.get(f'/api/clients?after_id={after_id}&limit=7&fields=name')
+        page = r.get_json()
+        assert all(set(c) == {'id', 'name'} for c in page)
+        seen += [c['id'] for c in page]
+        after_id = r.headers.get('X-Next-After-Id')
+    assert seen == sorted(seen) and len(seen) == 30
+
+    assert len(client.get('/api/clients').get_json()) == 30
+    assert client.get('/api/clients?fields=password').status_code == 400
+
+
+def test_client_payments_compressed(client, db):
+    _seed(db, 1)
+    db.executemany("INSERT INTO payments(client_id, year, month, amount) VALUES (1, ?, ?, 10)",
+                   [(y, m) for y in (2024, 2025, 2026) for m in range(1, 13)])
+    db.commit()
+    r = client.get('/api/client/1/payments', headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    payments = json.loads(gzip.decompress(r.data))
+    assert [(p['year'], p['month']) for p in payments][:2] == [(2024, 1), (2024, 2)]
+
+    r = client.get('/api/client/1/payments?limit=10&fields=year,month,status')
+    assert len(r.get_json()) == 10 and 'Content-Encoding' not in r.headers
+    assert set(r.get_json()[0]) == {'id', 'year', 'month', 'status'}
+
+
+def test_full_list_streamed_in_chunks(client, db, monkeypatch):
+    from backend.app.blueprints import api
+    monkeypatch.setattr(api, 'ROWS_CHUNK', 4)
+    _seed(db, 10)
+    r = client.get('/api/clients')
+    assert r.is_streamed
+    assert [c['name'] for c in r.get_json()] == [f'Cliente {i:03d}' for i in range(10)]
+    r = client.get('/api/clients?fields=name', headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(r.data))) == 10
+    # Total múltiplo del bloque: el último bloque llega vacío
+    monkeypatch.setattr(api, 'ROWS_CHUNK', 5)
+    r = client.get('/api/clients', headers={'Accept-Encoding': 'deflate'})
+    assert len(json.loads(zlib.decompress(r.data))) == 10
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_changes_feed_resumes_from_cursor(client, db):
+    _seed(db, 3)
+    db.execute("UPDATE clients SET name='Renombrado' WHERE id=2")
+    db.commit()
+
+    first = _lines(client.get('/api/changes?since=0&limit=2&tables=clients'))
+    assert [e['op'] for e in first[:-1]] == ['INSERT', 'INSERT']
+    assert first[-1]['has_more'] is True
+
+    rest = _lines(client.get(f"/api/changes?since={first[-1]['next_since']}&tables=clients"))
+    events, cursor = rest[:-1], rest[-1]
+    assert [e['op'] for e in events] == ['INSERT', 'UPDATE']
+    assert events[-1]['old']['name'] == 'Cliente 001' and events[-1]['new']['name'] == 'Renombrado'
+    assert cursor == {'next_since': events[-1]['id'], 'has_more': False}
+
+    assert _lines(client.get(f"/api/changes?since={cursor['next_since']}")) == [cursor]
+    assert client.get('/api/changes?tables=admins').status_code == 400
+
+
+def test_conditional_get_uses_change_token(client, db):
+    _seed(db, 2)
+    first = client.get('/api/clients')
+    etag = first.headers['ETag']
+
+    again = client.get('/api/clients', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['Vary'] == 'Accept-Encoding'
+    # El ETag depende de la URL: otra vista u otros parámetros no reutilizan el validador
+    assert client.get('/admin/panel', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/api/clients?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+    db.execute("UPDATE payments SET status='paid' WHERE client_id=1")
+    db.execute("INSERT INTO payments(client_id, year, month, amount) VALUES (1, 2026, 1, 10)")
+    db.commit()
+    changed = client.get('/api/clients', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    etag = changed.headers['ETag']
+    db.execute("INSERT INTO payment_plan_config(client_id, month, year, created_at) VALUES (1, 1, 2026, '2026-01-01')")
+    db.commit()
+    assert client.get('/api/clients', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_conditional_get_changes_with_date(client, db, monkeypatch):
+    from datetime import datetime as real_datetime, timezone
+    from werkzeug.http import http_date
+    from backend.app.utils import http
+
+    class NextDay(real_datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return real_datetime.now(tz) + timedelta(days=1)
+
+    first = client.get('/admin/panel')
+    etag = first.headers['ETag']
+    assert client.get('/admin/panel', headers={'If-None-Match': etag}).status_code == 304
+    # Pasada la medianoche la misma URL puede mostrar otro período: no se reutiliza el 304
+    monkeypatch.setattr(http, 'datetime', NextDay)
+    assert client.get('/admin/panel', headers={'If-None-Match': etag}).status_code == 200
+    today = http_date(real_datetime.now(timezone.utc))
+    assert client.get('/admin/panel', headers={'If-Modified-Since': today}).status_code == 200
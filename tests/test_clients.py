@@ -0,0 +1,109 @@
+def _seed(db):
+    db.executemany("INSERT INTO clients(name, phone, monthly_amount, signup_date) VALUES (?, ?, 10, '2026-01-01')",
+                   [('Mariana López', '999-111-222'), ('Ana María', '988 777 666'),
+                    ('Juan Marín', '+51 955 444 333'), ('Pedro Ruiz', None)])
+    db.commit()
+
+
+def _names(resp):
+    return [c['name'] for c in resp.get_json()]
+
+
+def test_search_json_prefix_first(client, db):
+    _seed(db)
+    assert _names(client.get('/clients/search.json?q=mar')) == ['Mariana López', 'Ana María', 'Juan Marín']
+    assert _names(client.get('/clients/search.json?q=111-222')) == ['Mariana López']
+    assert _names(client.get('/clients/search.json?q=pe')) == ['Pedro Ruiz']
+
+    db.execute("UPDATE clients SET name='Pedro Martín' WHERE name='Pedro Ruiz'")
+    db.execute("DELETE FROM clients WHERE name='Juan Marín'")
+    db.commit()
+    assert 'Pedro Martín' in _names(client.get('/clients/search.json?q=mart'))
+    assert 'Juan Marín' not in _names(client.get('/clients/search.json?q=mar'))
+
+
+def test_search_keyset_pages(db):
+    from backend.app.blueprints.clients import search_clients
+    _seed(db)
+    for q in ('', 'mar'):
+        seen = []
+        rows, cursor = search_clients(db, q, None, 2)
+        seen += [r['id'] for r in rows]
+        while cursor:
+            rows, cursor = search_clients(db, q, cursor, 2)
+            seen += [r['id'] for r in rows]
+        all_rows, _ = search_clients(db, q, None, 100)
+        assert seen == [r['id'] for r in all_rows]
+
+
+def test_add_client_backfills_months(client, db):
+    from datetime import date
+    from backend.app.maintenance import backfill_payments
+    today = date.today()
+    start = date(today.year - 2, today.month, 1)
+    client.post('/clients/add', data={'name': 'Nuevo', 'monthly_amount': '25',
+                                      'signup_date': start.isoformat()})
+    client_id = db.execute("SELECT id FROM clients WHERE name='Nuevo'").fetchone()[0]
+    rows = db.execute('SELECT year, month, amount FROM payments WHERE client_id=? ORDER BY year, month',
+                      (client_id,)).fetchall()
+    assert len(rows) == 25
+    assert (rows[0]['year'], rows[0]['month']) == (start.year, start.month)
+    assert (rows[-1]['year'], rows[-1]['month']) == (today.year, today.month)
+    assert backfill_payments(db) == 0
+
+
+def test_import_clients(client, db):
+    import io
+    import json
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nombre', 'Teléfono', 'Monto mensual', 'Fecha alta'])
+    ws.append(['Rosa', '999 111 000', 40, '2026-01-15'])
+    ws.append(['Tito', '999111000', 40, '2026-01-15'])
+    ws.append(['', '999 111 001', 40, '2026-01-15'])
+    ws.append(['Beto', '12', 40, '2026-01-15'])
+    ws.append(['Lia', None, '35,50', None])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+
+    resp = client.post('/clients/import', data={'file': (buf, 'clientes.xlsx')})
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    summary = lines[-1]
+    assert summary['done'] and summary['imported'] == 2 and summary['errors'] == 3
+    assert [e['line'] for e in summary['error_details']] == [3, 4, 5]
+
+    rosa = db.execute("SELECT id, phone, phone_e164 FROM clients WHERE name='Rosa'").fetchone()
+    assert rosa['phone'] == '999 111 000' and rosa['phone_e164'] == '+51999111000'
+    assert db.execute('SELECT COUNT(*) FROM payments WHERE client_id=?', (rosa['id'],)).fetchone()[0] > 0
+    assert db.execute("SELECT monthly_amount FROM clients WHERE name='Lia'").fetchone()[0] == 35.5
+
+def test_phone_e164_stored_and_looked_up(client, db):
+    client.post('/clients/add', data={'name': 'Eva', 'phone': '999 222 333', 'monthly_amount': '20'})
+    row = db.execute("SELECT phone, phone_e164 FROM clients WHERE name='Eva'").fetchone()
+    assert row['phone'] == '999 222 333'
+    assert row['phone_e164'] == '+51999222333'
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT * FROM clients WHERE phone_e164='+51999222333'").fetchall()
+    assert any('idx_clients_phone_e164' in r['detail'] for r in plan)
+
+    found = client.get('/api/clients/by-phone?phone=+51 999-222-333').get_json()
+    assert [c['name'] for c in found] == ['Eva']
+    assert client.get('/api/clients/by-phone?phone=123').get_json() == []
+
+
+def test_phone_e164_updates_not_audited(client, db):
+    from backend.app.utils.phones import backfill_phone_e164
+    db.execute("INSERT INTO clients(name, phone, monthly_amount, signup_date) VALUES ('Sin', '999 444 555', 10, '2026-01-01')")
+    db.commit()
+    before = db.execute("SELECT COUNT(*) FROM historial_cambios").fetchone()[0]
+    assert backfill_phone_e164(db) == 1
+    db.execute("UPDATE clients SET phone_e164=NULL")
+    db.commit()
+    assert db.execute("SELECT COUNT(*) FROM historial_cambios").fetchone()[0] == before
+
+    # Los UPDATE de columnas auditadas se siguen registrando, aunque no cambien el valor
+    db.execute("UPDATE clients SET active=active")
+    db.execute("UPDATE clients SET active=0")
+    db.commit()
+    assert db.execute("SELECT COUNT(*) FROM historial_cambios").fetchone()[0] == before + 2
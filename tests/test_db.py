@@ -0,0 +1,80 @@
+from backend.app import create_app
+from backend.app.db import get_db
+
+
+def test_connection_pragmas(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert db.execute('PRAGMA synchronous').fetchone()[0] == 1
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+
+def test_connection_reused_per_thread(app):
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        assert get_db() is first
+
+
+def test_connection_reuse_disabled(tmp_path):
+    app = create_app({'DATABASE': str(tmp_path / 'test.db'), 'SQLITE_REUSE_CONNECTIONS': False})
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        assert get_db() is not first
+
+
+def test_migrations_applied_once(app):
+    from backend.app.migrations import migrate, status, LATEST_VERSION
+    path = app.config['DATABASE']
+    version, pending = status(path)
+    assert version == LATEST_VERSION
+    assert pending == []
+    assert migrate(path) == []
+
+
+def test_schema_self_check(app):
+    from backend.app.db import check_schema
+    assert check_schema(app.config['DATABASE']) == []
+
+
+def test_client_balances_follow_payments(db):
+    from backend.app.maintenance import client_balances_drift
+    db.execute("INSERT INTO clients(id, name, monthly_amount, signup_date) VALUES (1, 'Ana', 50, '2026-01-01')")
+    db.executemany("INSERT INTO payments(client_id, year, month, amount, status) VALUES (1, 2026, ?, 50, 'pending')",
+                   [(m,) for m in range(1, 4)])
+    db.execute("UPDATE payments SET status='paid' WHERE month=1")
+    db.execute("UPDATE payments SET amount=70 WHERE month=2")
+    db.execute("DELETE FROM payments WHERE month=3")
+    db.commit()
+    row = db.execute('SELECT pending_count, total_debt, paid_count, total_paid FROM client_balances '
+                     'WHERE client_id=1').fetchone()
+    assert tuple(row) == (1, 70, 1, 50)
+    assert client_balances_drift(db) == []
+
+
+def test_backup_and_restore_through_backup_api(client, db, app, tmp_path):
+    import sqlite3
+    db.execute("INSERT INTO clients(name, monthly_amount, signup_date) VALUES ('Antes', 10, '2026-01-01')")
+    db.commit()
+    # Un lector con una instantánea abierta impide el checkpoint completo del WAL
+    reader = sqlite3.connect(app.config['DATABASE'])
+    reader.execute('BEGIN')
+    reader.execute('SELECT COUNT(*) FROM clients').fetchone()
+
+    backup = tmp_path / 'backup.db'
+    backup.write_bytes(client.get('/admin/backup').data)
+    copy = sqlite3.connect(backup)
+    assert copy.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert copy.execute('SELECT name FROM clients').fetchall() == [('Antes',)]
+    copy.close()
+    reader.rollback()
+    reader.close()
+
+    db.execute("INSERT INTO clients(name, monthly_amount, signup_date) VALUES ('Después', 10, '2026-01-01')")
+    db.commit()
+    with open(backup, 'rb') as f:
+        client.post('/admin/restore', data={'file': (f, 'backup.db')})
+    assert [r[0] for r in db.execute('SELECT name FROM clients')] == ['Antes']
@@ -0,0 +1,30 @@
+import logging
+import logging.handlers
+
+
+def test_app_logger_uses_queue(app):
+    logger = logging.getLogger('backend.app')
+    assert any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers)
+    assert logger.level == logging.INFO
+
+
+def test_log_level_from_config(tmp_path):
+    from backend.app import create_app
+    create_app({'DATABASE': str(tmp_path / 'test.db'), 'LOG_LEVEL': 'debug'})
+    assert logging.getLogger('backend.app').level == logging.DEBUG
+
+
+def test_invalid_log_level_falls_back_to_info(tmp_path):
+    from backend.app import create_app
+    create_app({'DATABASE': str(tmp_path / 'test.db'), 'LOG_LEVEL': 'verbose'})
+    assert logging.getLogger('backend.app').level == logging.INFO
+
+
+def test_log_args_resolved_when_enqueued(app):
+    logger = logging.getLogger('backend.app')
+    handler = next(h for h in logger.handlers if isinstance(h, logging.handlers.QueueHandler))
+    data = {'estado': 'pendiente'}
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 1, 'pago %s', (data,), None)
+    prepared = handler.prepare(record)
+    data['estado'] = 'pagado'
+    assert prepared.getMessage() == "pago {'estado': 'pendiente'}"
@@ -0,0 +1,47 @@
+def _seed(db):
+    db.execute("INSERT INTO clients(id, name, phone, monthly_amount, signup_date) VALUES (1, 'Ana', '999888777', 100, '2026-01-01')")
+    db.execute("INSERT INTO clients(id, name, phone, monthly_amount, signup_date) VALUES (2, 'Luis', '999888666', 80, '2026-01-01')")
+    db.execute("INSERT INTO payment_plan_config(client_id, month, year, payments_count, monthly_amount, created_at) VALUES (1, 3, 2026, 2, 120, datetime('now'))")
+    db.execute("INSERT INTO payment_plan_payments(client_id, month, year, payment_number, amount, paid, created_at) VALUES (1, 3, 2026, 1, 60, 1, datetime('now'))")
+    db.execute("INSERT INTO payment_plan_payments(client_id, month, year, payment_number, amount, paid, created_at) VALUES (1, 3, 2026, 2, 60, 0, datetime('now'))")
+    db.commit()
+
+
+def test_all_plans_summary(client, db):
+    _seed(db)
+    resp = client.get('/api/payment-plans?month=3&year=2026')
+    assert resp.status_code == 200
+    plans = resp.get_json()
+    assert plans['1'] == {'payments_count': 2, 'monthly_amount': 120, 'paid_count': 1,
+                          'total_paid': 60, 'total_pending': 60}
+    assert plans['2'] == {'payments_count': 1, 'monthly_amount': 80, 'paid_count': 0,
+                          'total_paid': 0, 'total_pending': 80}
+
+    etag = resp.headers['ETag']
+    resp = client.get('/api/payment-plans?month=3&year=2026', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+
+
+def test_update_plan_upserts_and_trims(client, db):
+    _seed(db)
+    resp = client.post('/api/payment-plans/update', json={
+        'client_id': 1, 'month': 3, 'year': 2026, 'payments_count': 4, 'monthly_amount': 200})
+    assert resp.get_json()['amount_per_payment'] == 50
+    rows = db.execute('SELECT payment_number, amount, paid FROM payment_plan_payments '
+                      'WHERE client_id=1 ORDER BY payment_number').fetchall()
+    assert [tuple(r) for r in rows] == [(1, 60, 1), (2, 50, 0), (3, 50, 0), (4, 50, 0)]
+
+    client.post('/api/payment-plans/update', json={
+        'client_id': 1, 'month': 3, 'year': 2026, 'payments_count': 2, 'monthly_amount': 120})
+    rows = db.execute('SELECT payment_number, amount, paid FROM payment_plan_payments '
+                      'WHERE client_id=1 ORDER BY payment_number').fetchall()
+    assert [tuple(r) for r in rows] == [(1, 60, 1), (2, 60, 0)]
+
+
+def test_update_plan_bulk(client, db):
+    _seed(db)
+    resp = client.post('/api/payment-plans/update-bulk', json={
+        'year': 2027, 'months': [1, 2, 3], 'payments_count': 2, 'monthly_amount': 100})
+    assert resp.get_json()['ok'] is True
+    assert db.execute('SELECT COUNT(*) FROM payment_plan_config WHERE year=2027').fetchone()[0] == 6
+    assert db.execute('SELECT COUNT(*) FROM payment_plan_payments WHERE year=2027').fetchone()[0] == 12
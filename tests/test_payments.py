@@ -0,0 +1,190 @@
+from datetime import date
+
+
+def _months_ago(n):
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - n
+    return index // 12, index % 12 + 1
+
+
+def _seed_debtors(db):
+    for client_id, name in [(1, 'Ana'), (2, 'Luis'), (3, 'Eva')]:
+        db.execute("INSERT INTO clients(id, name, monthly_amount, signup_date) VALUES (?, ?, 10, '2020-01-01')",
+                   (client_id, name))
+    rows = [(1, -1, 10), (1, 5, 100), (2, 2, 50), (3, 1, 50), (3, 0, 5)]
+    for client_id, ago, amount in rows:
+        year, month = _months_ago(ago)
+        db.execute("INSERT INTO payments(client_id, year, month, amount, status) VALUES (?, ?, ?, ?, 'pending')",
+                   (client_id, year, month, amount))
+    db.commit()
+
+
+def test_consolidada_backfills_year(client, db):
+    db.execute("INSERT INTO clients(id, name, monthly_amount, signup_date) VALUES (1, 'Ana', 30, '2026-01-01')")
+    db.execute("INSERT INTO payments(client_id, year, month, amount, status) VALUES (1, 2026, 3, 99, 'paid')")
+    db.commit()
+    assert client.get('/payments/consolidada?year=2026').status_code == 200
+    assert client.get('/payments/consolidada?year=2026').status_code == 200
+    rows = db.execute('SELECT month, amount FROM payments WHERE client_id=1 AND year=2026 ORDER BY month').fetchall()
+    assert [r['month'] for r in rows] == list(range(1, 13))
+    assert rows[2]['amount'] == 99 and rows[0]['amount'] == 30
+
+
+def test_morosos_keyset_pages(client, db, app):
+    _seed_debtors(db)
+    captured = []
+
+    from flask import template_rendered
+
+    def record(sender, template, context, **extra):
+        captured.append(context)
+    template_rendered.connect(record, app)
+
+    assert client.get('/payments/morosos?per_page=2').status_code == 200
+    first = captured[-1]
+    assert [r['id'] for r in first['rows']] == [1, 3]
+    assert first['rows'][0]['debt_90'] == 100
+    assert first['rows'][0]['debt_current'] == 10
+
+    client.get('/payments/morosos', query_string=first['next_page'])
+    second = captured[-1]
+    assert [r['id'] for r in second['rows']] == [2]
+    assert second['next_page'] is None
+
+    for r in first['rows'] + second['rows']:
+        assert r['debt_current'] + r['debt_30'] + r['debt_60'] + r['debt_90'] == r['total_debt']
+
+
+def test_export_all_streams_csv(client, db):
+    _seed_debtors(db)
+    db.execute("UPDATE payments SET status='paid' WHERE client_id=2")
+    db.commit()
+    resp = client.get('/payments/export/all?status=pending')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    lines = resp.get_data(as_text=True).strip().splitlines()
+    assert lines[0] == 'id,client_id,client_name,year,month,amount,status,paid_date,payment_type'
+    assert len(lines) == 1 + 4
+    assert all(',pending,' in line for line in lines[1:])
+
+    resp = client.get('/payments/export/1')
+    assert len(resp.get_data(as_text=True).strip().splitlines()) == 3
+
+
+def test_excel_one_sheet_per_client(client, db):
+    import io
+    from openpyxl import load_workbook
+    _seed_debtors(db)
+    resp = client.get('/payments/excel/all?by=client')
+    assert resp.status_code == 200
+    wb = load_workbook(io.BytesIO(resp.data), read_only=True)
+    assert wb.sheetnames == ['1 Ana', '2 Luis', '3 Eva']
+    assert len(list(wb['1 Ana'].rows)) == 3
+
+
+def test_invoice_cached_until_payments_change(client, db, app):
+    import os
+    _seed_debtors(db)
+    db.execute("UPDATE payments SET status='paid' WHERE client_id=1")
+    db.commit()
+    folder = os.path.join(app.config['REPORT_FOLDER'], 'invoices')
+
+    assert client.get('/payments/invoice/1').data.startswith(b'%PDF')
+    first = os.listdir(folder)
+    client.get('/payments/invoice/1')
+    assert os.listdir(folder) == first
+
+    db.execute("UPDATE payments SET amount=amount+1 WHERE client_id=1")
+    db.commit()
+    client.get('/payments/invoice/1')
+    assert len(os.listdir(folder)) == 1
+    assert os.listdir(folder) != first
+
+
+def test_invoices_zip(client, db):
+    import io
+    import zipfile
+    _seed_debtors(db)
+    resp = client.get('/payments/invoices.zip?client_ids=1,3')
+    zf = zipfile.ZipFile(io.BytesIO(resp.data))
+    assert sorted(zf.namelist()) == ['invoice_1.pdf', 'invoice_3.pdf']
+    assert zf.read('invoice_1.pdf').startswith(b'%PDF')
+    for bad in ('abc', '', '1,abc'):
+        assert client.get(f'/payments/invoices.zip?client_ids={bad}').status_code == 400
+
+
+def test_mark_paid_bulk(client, db):
+    _seed_debtors(db)
+    ids = [r['id'] for r in db.execute('SELECT id FROM payments WHERE client_id=3 ORDER BY id')]
+    db.execute("UPDATE payments SET status='paid' WHERE id=?", (ids[0],))
+    db.commit()
+    resp = client.post('/payments/mark_paid_bulk', json={'payment_ids': ids + [999], 'payment_type': 'cash'})
+    body = resp.get_json()
+    assert body['updated'] == 1
+    assert body['results'] == {str(ids[0]): 'already_paid', str(ids[1]): 'paid', '999': 'not_found'}
+    assert db.execute("SELECT pending_count FROM client_balances WHERE client_id=3").fetchone()[0] == 0
+
+    resp = client.post('/payments/mark_paid_bulk', json={'client_id': 1, 'from': '2000-01', 'to': '2100-12'})
+    assert resp.get_json()['updated'] == 2
+
+
+def test_mark_paid_bulk_rejects_scalar_ids(client, db):
+    _seed_debtors(db)
+    ids = [r['id'] for r in db.execute("SELECT id FROM payments WHERE status='pending' ORDER BY id")]
+    assert client.post('/payments/mark_paid_bulk', json={'payment_ids': '12'}).status_code == 400
+
+    # Formulario con el campo repetido: se aplican todos los ids, enteros
+    resp = client.post('/payments/mark_paid_bulk', data={'payment_ids': [str(ids[0]), str(ids[1])]})
+    assert resp.get_json()['updated'] == 2
+    resp = client.post('/payments/mark_paid_bulk', data={'payment_ids': str(ids[2])})
+    assert resp.get_json()['results'] == {str(ids[2]): 'paid'}
+    paid = {r[0] for r in db.execute("SELECT id FROM payments WHERE status='paid'")}
+    assert paid >= set(ids[:3]) and not paid & set(ids[3:])
+
+
+def test_revenue_rollup_follows_payments_and_plans(client, db):
+    from backend.app.maintenance import revenue_rollup_drift, rebuild_revenue_rollup
+    _seed_debtors(db)
+    db.execute("UPDATE payments SET status='paid' WHERE id IN (SELECT id FROM payments ORDER BY id LIMIT 3)")
+    db.execute("UPDATE payments SET amount = amount + 7 WHERE id = (SELECT MAX(id) FROM payments)")
+    db.execute("DELETE FROM payments WHERE id = (SELECT MIN(id) FROM payments WHERE status='pending')")
+    db.execute("INSERT INTO payment_plan_payments(client_id, month, year, payment_number, amount, created_at) "
+               "VALUES (1, 3, 2026, 1, 15, '2026-03-01'), (1, 3, 2026, 2, 15, '2026-03-01')")
+    db.execute("UPDATE payment_plan_payments SET paid=1 WHERE payment_number=1")
+    db.commit()
+    assert revenue_rollup_drift(db) == []
+    assert tuple(db.execute("SELECT paid_count, paid_amount, pending_amount FROM revenue_rollup "
+                      "WHERE source='plans'").fetchone()) == (1, 15, 15)
+
+    totals = db.execute("SELECT SUM(CASE WHEN status='paid' THEN 1 ELSE 0 END), "
+                        "SUM(CASE WHEN status='pending' THEN 1 ELSE 0 END) FROM payments").fetchone()
+    panel = client.get('/admin/panel').get_data(as_text=True)
+    assert str(totals[0]) in panel and str(totals[1]) in panel
+
+    db.execute("UPDATE revenue_rollup SET paid_amount = 0")
+    assert revenue_rollup_drift(db)
+    rebuild_revenue_rollup(db)
+    assert revenue_rollup_drift(db) == []
+
+
+def test_panel_totals_cached_per_data_version(client, db, app):
+    import sqlite3
+    _seed_debtors(db)
+    pending = db.execute("SELECT COUNT(*) FROM payments WHERE status='pending'").fetchone()[0]
+    first = client.get('/admin/panel')
+    assert f'>{pending}<' in first.get_data(as_text=True)
+
+    statements = []
+    db.set_trace_callback(statements.append)
+    assert f'>{pending}<' in client.get('/admin/panel').get_data(as_text=True)
+    db.set_trace_callback(None)
+    assert not any('revenue_rollup' in sql for sql in statements)
+
+    # Escritura desde otro proceso/conexión: cambia la versión y el panel se recalcula
+    other = sqlite3.connect(app.config['DATABASE'])
+    other.execute("UPDATE payments SET status='paid' WHERE id = (SELECT MIN(id) FROM payments WHERE status='pending')")
+    other.commit()
+    other.close()
+    fresh = client.get('/admin/panel', headers={'If-None-Match': first.headers['ETag']})
+    assert fresh.status_code == 200 and f'>{pending - 1}<' in fresh.get_data(as_text=True)
+    assert client.get('/admin/panel', headers={'If-None-Match': fresh.headers['ETag']}).status_code == 304
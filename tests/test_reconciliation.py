@@ -0,0 +1,78 @@
+import io
+
+
+def _seed(db):
+    db.execute("INSERT INTO clients(id, name, phone, monthly_amount, signup_date) VALUES (1, 'Ana Pérez', '999 888 777', 50, '2026-01-01')")
+    db.execute("INSERT INTO clients(id, name, phone, monthly_amount, signup_date) VALUES (2, 'Luis Soto', NULL, 80, '2026-01-01')")
+    db.executemany("INSERT INTO payments(client_id, year, month, amount, status) VALUES (?, 2026, ?, ?, 'pending')",
+                   [(1, 1, 50), (1, 2, 50), (2, 1, 80)])
+    db.execute("INSERT INTO payment_plan_payments(client_id, month, year, payment_number, amount, paid, created_at) "
+               "VALUES (2, 2, 2026, 1, 40, 0, datetime('now'))")
+    db.commit()
+
+
+def test_import_statement_matches_and_queues(client, db):
+    _seed(db)
+    statement = (
+        "Fecha;Teléfono;Nombre;Monto;Concepto\n"
+        "05/01/2026;+51 999-888-777;;50,00;yape\n"
+        "06/01/2026;;LUIS SOTO;80;deposito\n"
+        "07/01/2026;;luis soto;40;cuota\n"
+        "08/01/2026;;Desconocido;12;???\n"
+        "09/01/2026;;;-5;comision\n"
+    )
+    resp = client.post('/reconciliation/import', data={
+        'file': (io.BytesIO(statement.encode('utf-8')), 'extracto.csv')})
+    body = resp.get_json()
+    assert (body['matched_payments'], body['matched_plan_payments'], body['unmatched'], body['skipped']) == (2, 1, 1, 1)
+
+    paid = db.execute("SELECT client_id, month, paid_date FROM payments WHERE status='paid' ORDER BY client_id").fetchall()
+    assert [(r[0], r[1]) for r in paid] == [(1, 1), (2, 1)]
+    assert paid[0]['paid_date'].startswith('2026-01-05')
+    assert db.execute('SELECT paid FROM payment_plan_payments').fetchone()[0] == 1
+
+    queue = client.get('/reconciliation/queue').get_json()['items']
+    assert [q['name'] for q in queue] == ['Desconocido']
+
+    pending_id = db.execute("SELECT id FROM payments WHERE status='pending'").fetchone()[0]
+    resp = client.post(f"/reconciliation/queue/{queue[0]['id']}/resolve", json={'payment_id': pending_id})
+    assert resp.get_json()['status'] == 'matched'
+    assert client.get('/reconciliation/queue').get_json()['items'] == []
+
+
+def _post(client, statement):
+    return client.post('/reconciliation/import', data={
+        'file': (io.BytesIO(statement.encode('utf-8')), 'extracto.csv')}).get_json()
+
+
+def test_lines_for_an_already_paid_payment_are_queued(client, db, monkeypatch):
+    from backend.app.blueprints import reconciliation
+    db.execute("INSERT INTO clients(id, name, monthly_amount, signup_date) VALUES (1, 'Eva Ruiz', 30, '2026-01-01')")
+    db.execute("INSERT INTO payments(client_id, year, month, amount) VALUES (1, 2026, 1, 30)")
+    db.commit()
+    body = _post(client, "Nombre;Monto\nEva Ruiz;30\nEva Ruiz;30\n")
+    assert (body['matched_payments'], body['unmatched']) == (1, 1)
+
+    # Pagado por otro request entre la lectura del índice y la actualización
+    db.execute("INSERT INTO payments(client_id, year, month, amount) VALUES (1, 2026, 2, 30)")
+    db.commit()
+    build = reconciliation._build_index
+
+    def racing_index(conn):
+        index = build(conn)
+        conn.execute("UPDATE payments SET status='paid' WHERE month=2")
+        return index
+    monkeypatch.setattr(reconciliation, '_build_index', racing_index)
+    body = _post(client, "Nombre;Monto\nEva Ruiz;30\n")
+    assert (body['matched_payments'], body['unmatched']) == (0, 1)
+    assert len(client.get('/reconciliation/queue').get_json()['items']) == 2
+
+
+def test_resolve_dismiss_flag_parsed(client, db):
+    _post(client, "Nombre;Monto\nNadie;1.500\n")
+    item = client.get('/reconciliation/queue').get_json()['items'][0]
+    assert item['amount'] == 1500
+    resp = client.post(f"/reconciliation/queue/{item['id']}/resolve", data={'dismiss': 'false'})
+    assert resp.status_code == 400
+    resp = client.post(f"/reconciliation/queue/{item['id']}/resolve", data={'dismiss': 'on'})
+    assert resp.get_json()['status'] == 'dismissed'
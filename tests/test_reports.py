@@ -0,0 +1,57 @@
+from backend.app.utils import charts
+
+
+def test_chart_rendered_once_per_data_version(client, db, monkeypatch):
+    db.execute("INSERT INTO clients(id, name, monthly_amount, signup_date) VALUES (1, 'Ana', 10, '2026-01-01')")
+    db.executemany("INSERT INTO payments(client_id, year, month, amount, status) VALUES (1, 2026, ?, 10, ?)",
+                   [(m, 'paid' if m < 4 else 'pending') for m in range(1, 7)])
+    db.commit()
+    charts.cache.clear()
+    calls = []
+    render = charts.client_summary_png
+    monkeypatch.setattr(charts, 'client_summary_png', lambda *a: calls.append(a) or render(*a))
+
+    page = client.get('/reports/client/1').get_data(as_text=True)
+    assert '/reports/charts/client.png?' in page
+    src = page.split("src='", 1)[1].split("'", 1)[0].replace('&amp;', '&')
+
+    first = client.get(src)
+    assert first.mimetype == 'image/png' and first.data.startswith(b'\x89PNG')
+    assert 'immutable' in first.headers['Cache-Control']
+    assert client.get(src).data == first.data
+    assert len(calls) == 1
+    assert calls[0][1] == [1, 1, 1, 0, 0, 0]
+
+    db.execute("UPDATE payments SET status='paid' WHERE month=4")
+    db.commit()
+    client.get('/reports/charts/client.png?client_id=1')
+    assert len(calls) == 2
+
+    assert client.get('/reports/charts/global.png').data.startswith(b'\x89PNG')
+    assert client.get('/reports/charts/nope.png').status_code == 404
+
+
+def test_chart_failure_degrades_to_503(client, monkeypatch, caplog):
+    charts.cache.clear()
+
+    def broken(*args):
+        raise ValueError('datos inválidos')
+    monkeypatch.setattr(charts, 'global_summary_png', broken)
+    resp = client.get('/reports/charts/global.png')
+    assert resp.status_code == 503 and resp.headers['Retry-After']
+    assert 'Error generando el gráfico global' in caplog.text
+    assert client.get('/reports/global').status_code == 200
+
+
+def test_render_pool_runs_jobs_in_worker_process():
+    import os
+    from backend.app.utils import render_pool
+    assert render_pool.run(os.getpid) == os.getpid()  # sin pool: en el proceso actual
+    render_pool.start(1, timeout=60)
+    try:
+        assert render_pool.run(os.getpid) != os.getpid()
+        png = render_pool.run(charts.global_summary_png, [2025, 2026], [10.0, 20.0], [5.0, 0.0])
+        assert png.startswith(b'\x89PNG')
+    finally:
+        render_pool.shutdown()
+    assert render_pool.executor() is None
@@ -0,0 +1,10 @@
+from backend.app.importtime import measure
+
+# Presupuesto generoso para no fallar en máquinas lentas; hoy ronda los 300 ms
+STARTUP_BUDGET_MS = 2500
+
+
+def test_create_app_cold_start(tmp_path):
+    report = measure(str(tmp_path / 'startup.db'))
+    assert report['heavy'] == []
+    assert report['create_app_ms'] < STARTUP_BUDGET_MS
@@ -6,14 +6,33 @@ Usa Selenium + WhatsApp Web para envío masivo sin API de pago
 __version__ = "1.0.0"
 __author__ = "Sistema Pagos"
 
-from .config import WhatsAppConfig
-from .sender import WhatsAppSender
-from .scheduler import MessageScheduler
-from .templates import MessageTemplates
+import logging
 
-__all__ = [
-    'WhatsAppConfig',
-    'WhatsAppSender', 
-    'MessageScheduler',
-    'MessageTemplates'
-]
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# Los módulos de envío (Selenium) son opcionales: sin ellos el paquete
+# sigue ofreciendo las utilidades de whatsapp_sender.utils
+_SENDER_MODULES = ('config', 'sender', 'scheduler', 'templates', 'db_models')
+_OPTIONAL_DEPS = ('selenium', 'webdriver_manager', 'apscheduler')
+
+try:
+    from .config import WhatsAppConfig
+    from .sender import WhatsAppSender
+    from .scheduler import MessageScheduler
+    from .templates import MessageTemplates
+except ImportError as e:
+    # Sólo se toleran los módulos de envío ausentes o sus dependencias opcionales;
+    # cualquier otro ImportError es un error real dentro del paquete
+    missing = e.name or ''
+    if (missing not in {f'{__name__}.{m}' for m in _SENDER_MODULES}
+            and missing.split('.')[0] not in _OPTIONAL_DEPS):
+        raise
+    logger.info("Envío por WhatsApp Web no disponible (falta %s)", missing)
+    __all__ = []
+else:
+    __all__ = [
+        'WhatsAppConfig',
+        'WhatsAppSender', 
+        'MessageScheduler',
+        'MessageTemplates'
+    ]